@@ -0,0 +1,346 @@
+"""
+Shared core of the agent executors (simple_agent_executor and
+other/openai_agent_executor): the OpenRouter client pool, the
+tool-calling loop, tool schemas and JSON helpers.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import httpx
+from openai import AsyncOpenAI
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder/decoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Attempts the OpenAI SDK retries on connection errors, 408/409/429 and 5xx
+# responses, with jittered exponential backoff that honours Retry-After
+OPENROUTER_MAX_RETRIES = 4
+
+# Cap on concurrent OpenRouter requests across all agents in the process, so
+# bursts queue here instead of turning into 429s
+_LLM_SEMAPHORE = asyncio.Semaphore(int(os.getenv('OPENROUTER_MAX_CONCURRENCY', '32')))
+
+# One pooled OpenRouter client per API key, shared by every agent so the
+# TCP/TLS handshake is paid once rather than once per user session
+_shared_clients: Dict[str, AsyncOpenAI] = {}
+
+
+def get_shared_client(api_key: str) -> AsyncOpenAI:
+    """Return the process-wide OpenRouter client for this API key"""
+    client = _shared_clients.get(api_key)
+    if client is None:
+        client = _shared_clients[api_key] = AsyncOpenAI(
+            api_key=api_key,
+            base_url='https://openrouter.ai/api/v1',
+            default_headers={
+                'HTTP-Referer': 'http://localhost:10007',
+                'X-Title': 'GitHub Agent',
+            },
+            max_retries=OPENROUTER_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=60),
+            ),
+        )
+    return client
+
+
+async def close_shared_clients() -> None:
+    """Close the shared OpenRouter clients (call on application shutdown)"""
+    while _shared_clients:
+        _, client = _shared_clients.popitem()
+        await client.close()
+
+
+def _default(obj: Any) -> Any:
+    """Convert values the JSON encoder does not handle natively"""
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    if hasattr(obj, 'dict'):  # Pydantic v1 models
+        return obj.dict()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> str:
+        """Serialize a tool result to a JSON string"""
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> str:
+        """Serialize a tool result to a JSON string"""
+        return json.dumps(obj, default=_default)
+
+    loads = json.loads
+
+
+# JSON Schema types for annotated tool parameters; anything else is sent as a string
+_PY2JSON = {int: 'integer', float: 'number', bool: 'boolean', list: 'array', dict: 'object', str: 'string'}
+_EMPTY = inspect.Parameter.empty
+
+
+def function_schema(func: Callable) -> Dict[str, Any]:
+    """Return the OpenAI function schema for a tool function or bound method"""
+    # Cache on the underlying function so per-user tool instances are not kept alive
+    if inspect.ismethod(func):
+        return _schema_for(func.__func__, True)
+    return _schema_for(func, False)
+
+
+@lru_cache(maxsize=None)
+def _schema_for(func: Callable, bound: bool) -> Dict[str, Any]:
+    """Build the OpenAI function schema from a function's signature and docstring"""
+    params = list(inspect.signature(func).parameters.values())
+    if bound:
+        params = params[1:]  # Drop self
+
+    docstring = inspect.getdoc(func) or ''
+    description = docstring.split('\n', 1)[0] or func.__name__
+
+    properties = {}
+    required = []
+    for param in params:
+        # Check if parameter has default value
+        if param.default is _EMPTY:
+            required.append(param.name)
+        properties[param.name] = {
+            'type': _PY2JSON.get(param.annotation, 'string'),
+            'description': f'Parameter {param.name}',
+        }
+
+    return {
+        'name': func.__name__,
+        'description': description,
+        'parameters': {
+            'type': 'object',
+            'properties': properties,
+            'required': required,
+        },
+    }
+
+
+_TRUNCATED_MARKER = '…[truncated]'
+
+
+def compact_history(messages: list, max_tool_chars: int = 4096, keep_last_k: int = 4) -> None:
+    """Truncate tool results older than the last keep_last_k tool rounds, in place"""
+    # Walk newest to oldest; a tool message belongs to the round of the next
+    # assistant tool-call message found before it
+    newer_rounds = 0
+    limit = max_tool_chars + len(_TRUNCATED_MARKER)
+    for message in reversed(messages):
+        role = message['role']
+        if role == 'assistant' and message.get('tool_calls'):
+            newer_rounds += 1
+        elif role == 'tool' and newer_rounds >= keep_last_k:
+            content = message['content']
+            if len(content) > limit:
+                message['content'] = content[:max_tool_chars] + _TRUNCATED_MARKER
+
+
+def system_message(prompt: str, cache: bool) -> Dict[str, Any]:
+    """Build the system history entry, marked for provider-side prompt caching when cache is set"""
+    if not cache:
+        return {'role': 'system', 'content': prompt}
+    # Anthropic caches the request prefix up to the marked block, which
+    # covers the tool schemas as well as the prompt itself
+    return {
+        'role': 'system',
+        'content': [{'type': 'text', 'text': prompt, 'cache_control': {'type': 'ephemeral'}}],
+    }
+
+
+def assistant_message(content: Any, tool_calls: list) -> Dict[str, Any]:
+    """Build an assistant history entry, leaving out tool_calls when there are none"""
+    # Some providers reject an explicit null tool_calls
+    message = {'role': 'assistant', 'content': content}
+    if tool_calls:
+        message['tool_calls'] = tool_calls
+    return message
+
+
+class ToolCallingAgent:
+    """OpenRouter tool-calling loop shared by the chat agent and the A2A executor"""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        tools: Dict[str, Any],
+        model: str,
+        fast_model: Optional[str],
+        cache_prompt: Optional[bool] = None,
+    ):
+        self.client = client
+        self.tools = tools
+        self.model = model
+        # Cheaper model for the turns that follow a tool round, which mostly
+        # pick the next tool; None sends every turn to self.model
+        self.fast_model = fast_model
+        # Prompt caching hints are only understood on Anthropic routes
+        self.cache_prompt = model.startswith('anthropic/') if cache_prompt is None else cache_prompt
+        # Iteration (1-based) from which the main model must answer without
+        # calling tools; None means the last allowed iteration
+        self.force_finalize_iteration: Optional[int] = None
+        # Schemas and bound methods depend only on the tools, so build them once
+        self._tool_methods = {
+            name: getattr(instance, name) for name, instance in tools.items() if hasattr(instance, name)
+        }
+        self._openai_tools = [
+            {'type': 'function', 'function': function_schema(method)}
+            for method in self._tool_methods.values()
+        ]
+        self._tools_arg = self._openai_tools or None
+        self._tool_choice_arg = 'auto' if self._openai_tools else None
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the shared OpenRouter clients (call on application shutdown)"""
+        await close_shared_clients()
+
+    async def run_tool_loop(
+        self, messages: List[Dict[str, Any]], max_iterations: int
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Run the model and its tool calls until it answers, yielding events.
+
+        Yields ('text', delta) for answer text as it streams in,
+        ('tool_calls', names) after each round of tool calls and
+        ('final', content) once with the complete answer. Ends without a
+        'final' event when max_iterations runs out or the answer is empty.
+        API and tool errors propagate to the caller.
+        """
+        # The first turn goes to the main model so a chat that needs no tools
+        # costs one completion and streams straight away; only the turns after
+        # a tool round go to the fast model, until it stops calling tools
+        use_fast_model = False
+        finalize_at = self.force_finalize_iteration or max_iterations
+
+        for iteration in range(1, max_iterations + 1):
+            # Near the limit, have the main model answer instead of looping on
+            # tools. The tools stay in the request: Anthropic rejects tool
+            # history without them, and dropping them would miss the prompt cache
+            finalize = iteration >= finalize_at and self._tools_arg is not None
+            if finalize:
+                use_fast_model = False
+
+            # Hold a slot for the whole streamed response so the number of open
+            # OpenRouter requests stays capped under load
+            async with _LLM_SEMAPHORE:
+                # Stream the completion so text reaches the user as it is generated
+                stream = await self.client.chat.completions.create(
+                    model=self.fast_model if use_fast_model else self.model,
+                    messages=messages,
+                    tools=self._tools_arg,
+                    tool_choice='none' if finalize else self._tool_choice_arg,
+                    temperature=0.1,
+                    max_tokens=4000,
+                    stream=True,
+                )
+
+                content_parts: List[str] = []
+                tool_calls: Dict[int, Dict[str, Any]] = {}
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        if use_fast_model and not tool_calls and not delta.tool_calls:
+                            # The fast model is answering rather than picking a
+                            # tool: stop paying for a draft that would be thrown
+                            # away and hand the turn to the main model
+                            await stream.close()
+                            break
+                        content_parts.append(delta.content)
+                        if not use_fast_model:
+                            yield 'text', delta.content
+                    # Tool calls arrive in fragments; stitch them together by index
+                    for tc in delta.tool_calls or ():
+                        call = tool_calls.setdefault(tc.index, {
+                            'id': None,
+                            'type': 'function',
+                            'function': {'name': '', 'arguments': ''},
+                        })
+                        if tc.id:
+                            call['id'] = tc.id
+                        if tc.function:
+                            if tc.function.name:
+                                call['function']['name'] += tc.function.name
+                            if tc.function.arguments:
+                                call['function']['arguments'] += tc.function.arguments
+
+            content = ''.join(content_parts) or None
+            message_tool_calls = [tool_calls[i] for i in sorted(tool_calls)]
+            messages.append(assistant_message(content, message_tool_calls))
+
+            if message_tool_calls:
+                # Tool calls are independent, so run them concurrently and
+                # append the results in the order they were requested
+                results = await asyncio.gather(
+                    *(self._run_tool(tool_call) for tool_call in message_tool_calls)
+                )
+                for tool_call, result_json in zip(message_tool_calls, results):
+                    messages.append({
+                        'role': 'tool',
+                        'tool_call_id': tool_call['id'],
+                        'content': result_json,
+                    })
+                # Only the latest tool results are resent in full
+                compact_history(messages)
+                use_fast_model = self.fast_model is not None
+
+                yield 'tool_calls', [tool_call['function']['name'] for tool_call in message_tool_calls]
+                continue
+
+            if use_fast_model:
+                # The fast model is done with tools; discard what it started
+                # and let the main model write the answer the user sees
+                messages.pop()
+                use_fast_model = False
+                continue
+
+            if content:
+                yield 'final', content
+            return
+
+    async def _run_tool(self, tool_call: Dict[str, Any]) -> str:
+        """Execute one tool call and return its serialized result"""
+        function = tool_call['function']
+        function_name = function['name']
+        function_args = loads(function['arguments'] or '{}')
+
+        logger.debug(f'Calling function: {function_name} with args: {function_args}')
+
+        # Only tools with a bound method were advertised to the model, so one
+        # lookup covers both unknown names and tools missing their method
+        method = self._tool_methods.get(function_name)
+        if method is None:
+            result = {'error': f'Function {function_name} not found'}
+        elif asyncio.iscoroutinefunction(method):
+            result = await method(**function_args)
+        else:
+            # Toolset methods are blocking PyGithub calls
+            result = await asyncio.to_thread(method, **function_args)
+
+        # Pydantic models go straight to JSON in one pass, and dropping nulls
+        # keeps the context sent back to the model small
+        if hasattr(result, 'model_dump_json'):
+            return result.model_dump_json(by_alias=True, exclude_none=True)
+        if hasattr(result, 'dict') or isinstance(result, dict):
+            return dumps(result)
+        return str(result)
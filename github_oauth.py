@@ -1,18 +1,48 @@
 import os
+import asyncio
 import secrets
 import hashlib
+import itertools
 import base64
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from urllib.parse import urlencode, parse_qs
+from typing import Optional, Dict, Any, KeysView
+from urllib.parse import urlencode, parse_qs, quote_plus
 import httpx
-from pydantic import BaseModel
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # Fall back to the stdlib decoder
+    _json_loads = json.loads
+
 load_dotenv()
 
+GITHUB_API_ACCEPT = 'application/vnd.github.v3+json'
+
+# User info cache settings
+USER_INFO_CACHE_TTL = 300  # seconds
+USER_INFO_CACHE_MAX_SIZE = 10000
+
+# Seconds an idle pooled connection to GitHub is kept open
+CONNECTION_KEEPALIVE_EXPIRY = 120
+
+# Seconds a finished token exchange is kept to dedupe retries of the same code
+INFLIGHT_EXCHANGE_TTL = 10
+
+# Longest wait before retrying a rate-limited (403/429) GitHub request
+RATE_LIMIT_MAX_WAIT = 60  # seconds
 
-class OAuthConfig(BaseModel):
+# Maximum number of users kept in in-memory token storage
+TOKEN_STORAGE_MAX_SIZE = 15000
+
+
+@dataclass(slots=True)
+class OAuthConfig:
     """GitHub OAuth configuration"""
     client_id: str
     client_secret: str
@@ -21,56 +51,183 @@ class OAuthConfig(BaseModel):
     state_length: int = 32
 
 
-class OAuthToken(BaseModel):
-    """OAuth token information"""
+@dataclass(slots=True, frozen=True)
+class OAuthToken:
+    """OAuth token information (immutable and hashable)"""
     access_token: str
-    token_type: str = "bearer"
     scope: str
+    token_type: str = "bearer"
     expires_at: Optional[datetime] = None
     refresh_token: Optional[str] = None
     user_id: Optional[str] = None
     user_login: Optional[str] = None
+    # Process-local time.monotonic() deadline mirroring expires_at
+    expires_monotonic: Optional[float] = None
+
+
+# Environment is process-constant, so read it once at import time
+_DEFAULT_CONFIG = OAuthConfig(
+    client_id=os.getenv('GITHUB_CLIENT_ID', ''),
+    client_secret=os.getenv('GITHUB_CLIENT_SECRET', ''),
+    redirect_uri=os.getenv('GITHUB_REDIRECT_URI', ''),
+    scope=os.getenv('GITHUB_OAUTH_SCOPE', '')
+)
 
 
 class GitHubOAuth:
     """GitHub OAuth authentication handler"""
     
-    def __init__(self):
-        self.config = OAuthConfig(
-            client_id=os.getenv('GITHUB_CLIENT_ID', ''),
-            client_secret=os.getenv('GITHUB_CLIENT_SECRET', ''),
-            redirect_uri=os.getenv('GITHUB_REDIRECT_URI', ''),
-            scope=os.getenv('GITHUB_OAUTH_SCOPE', '')
-        )
+    def __init__(self, config: Optional[OAuthConfig] = None):
+        self.config = config or _DEFAULT_CONFIG
         self.base_url = "https://github.com"
         self.api_url = "https://api.github.com"
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[tuple[str, Optional[str], bool], asyncio.Future] = {}
+        # Secret key for state generation, read from the OS once per handler
+        self._state_key = os.urandom(32)
+        self._state_counter = itertools.count()
+        self._user_info_cache: OrderedDict[bytes, tuple[float, Dict[str, Any]]] = OrderedDict()
+        
+        # Pre-encoded static token exchange form fields; only the code varies per callback
+        self._token_body_prefix = urlencode({
+            'client_id': self.config.client_id,
+            'client_secret': self.config.client_secret,
+            'redirect_uri': self.config.redirect_uri
+        }).encode() + b'&code='
+        self._static_headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
         
-    def generate_authorization_url(self, state: Optional[str] = None) -> tuple[str, str]:
+        # Authorization URL is constant except for the trailing state
+        self._auth_url_prefix = f"{self.base_url}/login/oauth/authorize?" + urlencode({
+            'client_id': self.config.client_id,
+            'redirect_uri': self.config.redirect_uri,
+            'scope': self.config.scope,
+            'allow_signup': 'true'
+        }) + "&state="
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared HTTP client, creating it on first use
+        
+        Returns:
+            httpx.AsyncClient: Long-lived client with keep-alive connection pooling
+        """
+        if self._client is None:
+            # Long keep-alive keeps warm connections reusable, skipping the DNS, TCP and
+            # TLS setup of a new one; connections are pooled per origin, so github.com
+            # and api.github.com each keep their own
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=1,
+                limits=httpx.Limits(
+                    max_keepalive_connections=20,
+                    max_connections=100,
+                    keepalive_expiry=CONNECTION_KEEPALIVE_EXPIRY
+                )
+            )
+            self._client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(10.0)
+            )
+        return self._client
+    
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request on the shared client, respecting GitHub rate limits
+        
+        Rate limits are per token and this handler serves every user, so it
+        only waits when a request is actually rejected: a 403/429 is retried
+        once after its Retry-After delay, or after the budget reset when
+        X-RateLimit-Remaining is 0.
+        """
+        client = self._get_client()
+        response = await client.request(method, url, **kwargs)
+        
+        if response.status_code in (403, 429):
+            wait = self._rate_limit_wait(response)
+            if wait is not None:
+                await asyncio.sleep(min(wait, RATE_LIMIT_MAX_WAIT))
+                response = await client.request(method, url, **kwargs)
+        
+        return response
+    
+    @staticmethod
+    def _rate_limit_wait(response: httpx.Response) -> Optional[float]:
+        """Seconds to wait before retrying a rejected request, or None if it wasn't rate limited"""
+        headers = response.headers
+        retry_after = headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        reset = headers.get('X-RateLimit-Reset')
+        if headers.get('X-RateLimit-Remaining') == '0' and reset and reset.isdigit():
+            return max(float(reset) - time.time(), 0.0)
+        return None
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        
+    def generate_authorization_url(
+        self,
+        state: Optional[str] = None,
+        code_challenge: Optional[str] = None
+    ) -> tuple[str, str]:
         """Generate GitHub OAuth authorization URL
         
+        Args:
+            state: State parameter (generated if not provided)
+            code_challenge: PKCE S256 code challenge from generate_pkce (optional)
+        
         Returns:
             tuple: (authorization_url, state) - URL to redirect user to and state for verification
         """
         if not state:
-            state = secrets.token_urlsafe(self.config.state_length)
-            
-        params = {
-            'client_id': self.config.client_id,
-            'redirect_uri': self.config.redirect_uri,
-            'scope': self.config.scope,
-            'state': state,
-            'allow_signup': 'true'
-        }
+            state = self._new_state()
         
-        auth_url = f"{self.base_url}/login/oauth/authorize?{urlencode(params)}"
+        auth_url = self._auth_url_prefix + quote_plus(state)
+        if code_challenge:
+            auth_url += f"&code_challenge={code_challenge}&code_challenge_method=S256"
         return auth_url, state
     
-    async def exchange_code_for_token(self, code: str, state: str) -> OAuthToken:
+    def _new_state(self) -> str:
+        """Derive an unguessable state from the per-process key, clock and counter"""
+        nonce = f"{time.time_ns()}:{next(self._state_counter)}".encode()
+        digest = hashlib.blake2b(
+            nonce,
+            key=self._state_key,
+            digest_size=min(self.config.state_length, 64)
+        ).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+    
+    @staticmethod
+    def generate_pkce() -> tuple[str, str]:
+        """Generate a PKCE code verifier and its S256 code challenge
+        
+        Returns:
+            tuple: (code_verifier, code_challenge)
+        """
+        verifier = secrets.token_urlsafe(64)
+        challenge = base64.urlsafe_b64encode(
+            hashlib.sha256(verifier.encode()).digest()
+        ).rstrip(b'=').decode()
+        return verifier, challenge
+    
+    async def exchange_code_for_token(
+        self,
+        code: str,
+        state: str,
+        code_verifier: Optional[str] = None,
+        fetch_user_info: bool = True
+    ) -> OAuthToken:
         """Exchange authorization code for access token
         
         Args:
             code: Authorization code from GitHub
             state: State parameter for verification
+            code_verifier: PKCE code verifier matching the authorization request (optional)
+            fetch_user_info: Look up user_id/user_login via /user; skip to save a round trip
             
         Returns:
             OAuthToken: Token information
@@ -78,72 +235,131 @@ class GitHubOAuth:
         Raises:
             ValueError: If token exchange fails
         """
+        # Concurrent callers with the same code and options share a single exchange
+        key = (code, code_verifier, fetch_user_info)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            token = await self._exchange_code_for_token(code, code_verifier, fetch_user_info)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure isn't logged as never retrieved
+            future.exception()
+            # Keep the failure briefly to absorb immediate retries of the same code
+            loop.call_later(INFLIGHT_EXCHANGE_TTL, self._inflight.pop, key, None)
+            raise
+        except BaseException:
+            # Cancelled (e.g. client disconnect): fail the callers waiting on this
+            # exchange instead of leaving them hanging, and let a retry start afresh
+            future.set_exception(ValueError("Token exchange was cancelled"))
+            future.exception()
+            self._inflight.pop(key, None)
+            raise
+        else:
+            future.set_result(token)
+            # Keep the result briefly to absorb immediate retries of the same code
+            loop.call_later(INFLIGHT_EXCHANGE_TTL, self._inflight.pop, key, None)
+            return token
+    
+    async def _exchange_code_for_token(
+        self,
+        code: str,
+        code_verifier: Optional[str],
+        fetch_user_info: bool
+    ) -> OAuthToken:
+        """Perform the token exchange and user lookup against GitHub"""
         if not self.config.client_id or not self.config.client_secret:
             raise ValueError("GitHub OAuth not configured. Please set GITHUB_CLIENT_ID and GITHUB_CLIENT_SECRET")
             
-        data = {
-            'client_id': self.config.client_id,
-            'client_secret': self.config.client_secret,
-            'code': code,
-            'redirect_uri': self.config.redirect_uri
-        }
-        
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
+        body = self._token_body_prefix + quote_plus(code).encode()
+        if code_verifier:
+            body += b'&code_verifier=' + quote_plus(code_verifier).encode()
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/login/oauth/access_token",
-                data=data,
-                headers=headers
-            )
+        response = await self._request(
+            'POST',
+            f"{self.base_url}/login/oauth/access_token",
+            content=body,
+            headers=self._static_headers
+        )
             
-        if response.status_code != 200:
+        if response.status_code != 200 or not response.content:
             raise ValueError(f"Token exchange failed: {response.status_code} - {response.text}")
             
-        token_data = response.json()
+        token_data = _json_loads(response.content)
         
         if 'error' in token_data:
-            raise ValueError(f"OAuth error: {token_data['error_description']}")
+            raise ValueError(
+                f"OAuth error: {token_data.get('error_description', token_data['error'])}"
+            )
             
         # Get user information
-        user_info = await self._get_user_info(token_data['access_token'])
+        user_id = user_login = None
+        if fetch_user_info:
+            user_info = await self._get_user_info(token_data['access_token'])
+            user_id = str(user_info.get('id', ''))
+            user_login = user_info.get('login', '')
+        
+        # GitHub tokens don't expire by default; expiring user tokens report expires_in
+        expires_at = expires_monotonic = None
+        expires_in = token_data.get('expires_in')
+        if expires_in:
+            expires_at = datetime.now() + timedelta(seconds=int(expires_in))
+            expires_monotonic = time.monotonic() + int(expires_in)
         
         return OAuthToken(
             access_token=token_data['access_token'],
             token_type=token_data.get('token_type', 'bearer'),
             scope=token_data.get('scope', ''),
-            user_id=str(user_info.get('id', '')),
-            user_login=user_info.get('login', ''),
-            expires_at=None  # GitHub tokens don't expire by default
+            user_id=user_id,
+            user_login=user_login,
+            expires_at=expires_at,
+            expires_monotonic=expires_monotonic
         )
     
-    async def _get_user_info(self, access_token: str) -> Dict[str, Any]:
+    async def _get_user_info(self, access_token: str, force: bool = False) -> Dict[str, Any]:
         """Get user information from GitHub API
         
+        Results are cached per token for USER_INFO_CACHE_TTL seconds.
+        
         Args:
             access_token: GitHub access token
+            force: Bypass the cache and always query GitHub
             
         Returns:
             Dict: User information
         """
+        cache_key = hashlib.blake2b(access_token.encode(), digest_size=16).digest()
+        cached = self._user_info_cache.get(cache_key)
+        if cached and not force and time.monotonic() - cached[0] < USER_INFO_CACHE_TTL:
+            self._user_info_cache.move_to_end(cache_key)
+            return cached[1]
+        
+        # Built per request so the cache never holds the plaintext token
         headers = {
-            'Authorization': f'token {access_token}',
-            'Accept': 'application/vnd.github.v3+json'
+            'Authorization': 'token ' + access_token,
+            'Accept': GITHUB_API_ACCEPT
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.api_url}/user",
-                headers=headers
-            )
+        response = await self._request(
+            'GET',
+            f"{self.api_url}/user",
+            headers=headers
+        )
             
         if response.status_code != 200:
             raise ValueError(f"Failed to get user info: {response.status_code}")
             
-        return response.json()
+        user_info = _json_loads(response.content)
+        self._user_info_cache[cache_key] = (time.monotonic(), user_info)
+        self._user_info_cache.move_to_end(cache_key)
+        if len(self._user_info_cache) > USER_INFO_CACHE_MAX_SIZE:
+            self._user_info_cache.popitem(last=False)
+        return user_info
     
     async def refresh_token(self, refresh_token: str) -> OAuthToken:
         """Refresh access token (GitHub doesn't support refresh tokens by default)
@@ -162,6 +378,9 @@ class GitHubOAuth:
     def validate_token(self, token: OAuthToken) -> bool:
         """Validate if token is still valid
         
+        This is a local expiry check and makes no API request, so it is
+        cheap enough to call on every status check without caching.
+        
         Args:
             token: OAuth token to validate
             
@@ -170,15 +389,18 @@ class GitHubOAuth:
         """
         if not token.access_token:
             return False
-            
-        if token.expires_at and token.expires_at < datetime.now():
-            return False
-            
-        return True
+        
+        if token.expires_monotonic is not None:
+            return time.monotonic() < token.expires_monotonic
+        
+        # Tokens restored from another process only carry the wall-clock expiry
+        return token.expires_at is None or token.expires_at >= datetime.now()
     
     def get_authorization_header(self, token: OAuthToken) -> Dict[str, str]:
         """Get authorization header for API requests
         
+        Built per call so no cache outlives the token (e.g. after logout).
+        
         Args:
             token: OAuth token
             
@@ -187,24 +409,28 @@ class GitHubOAuth:
         """
         return {
             'Authorization': f'{token.token_type} {token.access_token}',
-            'Accept': 'application/vnd.github.v3+json'
+            'Accept': GITHUB_API_ACCEPT
         }
 
 
 class TokenStorage:
-    """Simple in-memory token storage (in production, use Redis or database)"""
+    """In-memory LRU token storage, bounded to `max_size` users"""
     
-    def __init__(self):
-        self._tokens: Dict[str, OAuthToken] = {}
+    def __init__(self, max_size: int = TOKEN_STORAGE_MAX_SIZE):
+        self._tokens: OrderedDict[str, OAuthToken] = OrderedDict()
+        self._max_size = max_size
     
     def store_token(self, user_id: str, token: OAuthToken) -> None:
-        """Store token for user
+        """Store token for user, evicting the least recently used if full
         
         Args:
             user_id: User identifier
             token: OAuth token
         """
         self._tokens[user_id] = token
+        self._tokens.move_to_end(user_id)
+        if len(self._tokens) > self._max_size:
+            self._tokens.popitem(last=False)
     
     def get_token(self, user_id: str) -> Optional[OAuthToken]:
         """Get token for user
@@ -215,7 +441,10 @@ class TokenStorage:
         Returns:
             OAuthToken or None if not found
         """
-        return self._tokens.get(user_id)
+        token = self._tokens.get(user_id)
+        if token is not None:
+            self._tokens.move_to_end(user_id)
+        return token
     
     def remove_token(self, user_id: str) -> None:
         """Remove token for user
@@ -225,13 +454,13 @@ class TokenStorage:
         """
         self._tokens.pop(user_id, None)
     
-    def list_users(self) -> list[str]:
+    def list_users(self) -> KeysView[str]:
         """List all users with stored tokens
         
         Returns:
-            List of user IDs
+            Live view of user IDs (wrap in list() to snapshot)
         """
-        return list(self._tokens.keys())
+        return self._tokens.keys()
 
 
 # Global token storage instance
@@ -1,16 +1,258 @@
+import hashlib
 import os
+import re
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Iterator, Optional
 
+import requests
 from github import Auth, Github   # Used to interact with the GitHub API.
 from pydantic import BaseModel, Field    # Used for data validation and serialization
 from dotenv import load_dotenv
 from github_oauth import token_storage, OAuthToken
 
+try:
+    import re2 as _re_engine  # google-re2: linear-time matching, no backtracking
+except ImportError:
+    _re_engine = re
+
 
 load_dotenv()
 
+# ------------------------------
+# Diff parsing patterns (compiled once at import)
+# ------------------------------
+_EXT_TO_LANG: dict[str, str] = {
+    '.py': 'python',
+    '.ts': 'typescript', '.tsx': 'typescript',
+    '.js': 'javascript', '.jsx': 'javascript',
+    '.java': 'java',
+    '.go': 'go',
+    '.cls': 'apex', '.trigger': 'apex', '.apex': 'apex',
+    '.css': 'css',
+    '.html': 'html', '.htm': 'html',
+    '.c': 'c', '.h': 'c',
+    '.cpp': 'cpp', '.cc': 'cpp', '.cxx': 'cpp', '.hpp': 'cpp', '.hh': 'cpp', '.hxx': 'cpp',
+    '.cs': 'csharp',
+}
+
+# Capture function context from hunk headers: @@ ... function signature ... @@
+_HUNK_HEADER_RE = re.compile(r'^@@.*?@@\s*(.*)$')
+_CONTEXT_NAME_RE = re.compile(r'([A-Za-z_$][\w$]*)\s*\(')
+
+# Language-specific regexes for added/removed declarations
+_LANG_PATTERNS: dict[str, dict[str, re.Pattern[str]]] = {
+    'python': {
+        'func': re.compile(r'^[+\-]\s*def\s+([A-Za-z_][A-Za-z0-9_]*)\s*\('),
+        'class': re.compile(r'^[+\-]\s*class\s+([A-Za-z_][A-Za-z0-9_]*)\s*[:\(]'),
+        'method': re.compile(r'^[+\-]\s*def\s+([A-Za-z_][A-Za-z0-9_]*)\s*\('),
+    },
+    'javascript': {
+        'func': re.compile(r'^[+\-]\s*(?:function\s+([A-Za-z_$][\w$]*)\s*\(|const\s+([A-Za-z_$][\w$]*)\s*=\s*\([^)]*\)\s*=>|([A-Za-z_$][\w$]*)\s*=\s*function\s*\()'),
+        'class': re.compile(r'^[+\-]\s*class\s+([A-Za-z_$][\w$]*)\s*'),
+        'method': re.compile(r'^[+\-]\s*([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*\{'),
+    },
+    'typescript': {
+        'func': re.compile(r'^[+\-]\s*(?:function\s+([A-Za-z_$][\w$]*)\s*\(|const\s+([A-Za-z_$][\w$]*)\s*=\s*\([^)]*\)\s*=>)'),
+        'class': re.compile(r'^[+\-]\s*class\s+([A-Za-z_$][\w$]*)\s*'),
+        'method': re.compile(r'^[+\-]\s*(?:public|private|protected|static|readonly|async)?\s*([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*\{'),
+    },
+    'java': {
+        'func': re.compile(r'^[+\-]\s*(?:public|private|protected|static|final|synchronized|native|abstract|default)?\s*[\w\<\>\[\]]+\s+([a-zA-Z_][\w]*)\s*\('),
+        'class': re.compile(r'^[+\-]\s*(?:public|private|protected)?\s*(?:final\s+)?class\s+([A-Za-z_][\w]*)'),
+        'method': re.compile(r'^[+\-]\s*(?:public|private|protected|static|final|synchronized|native|abstract|default)?\s*[\w\<\>\[\]]+\s+([a-zA-Z_][\w]*)\s*\('),
+    },
+    'go': {
+        'func': re.compile(r'^[+\-]\s*func\s+(?:\([^)]*\)\s*)?([A-Za-z_][\w]*)\s*\('),
+        'class': re.compile(r'\bstruct\b\s+([A-Za-z_][\w]*)'),
+        'method': re.compile(r'^[+\-]\s*func\s*\([^)]*\)\s*([A-Za-z_][\w]*)\s*\('),
+    },
+    # Apex (Salesforce): classes, methods, and triggers
+    'apex': {
+        'class': re.compile(r'^[+\-]\s*(?:global|public|private|protected)?\s*class\s+([A-Za-z_][\w]*)'),
+        'method': re.compile(r'^[+\-]\s*(?:global|public|private|protected|static|virtual|override|abstract|testmethod)?\s*[\w<>,\[\]\s]+\s+([A-Za-z_][\w]*)\s*\('),
+        'func': re.compile(r'^[+\-]\s*trigger\s+([A-Za-z_][\w]*)\s+on\s+[A-Za-z_][\w]*\s*\('),
+    },
+    # C (heuristic): functions
+    'c': {
+        'func': re.compile(r'^[+\-]\s*(?:[A-Za-z_][\w\s\*]*\s+)+([A-Za-z_][\w]*)\s*\([^;]*\)\s*\{'),
+    },
+    # C++ (heuristic): classes/structs and functions/methods (including scope ::)
+    'cpp': {
+        'class': re.compile(r'^[+\-]\s*(?:template\s*<[^>]+>\s*)?(?:class|struct)\s+([A-Za-z_][\w]*)'),
+        'func': re.compile(r'^[+\-]\s*(?:[\w:<>,\s\*&]+)\s+([A-Za-z_][\w]*(?:::[A-Za-z_][\w]*)?)\s*\([^;{)]*\)\s*\{'),
+        'method': re.compile(r'^[+\-]\s*(?:[\w:<>,\s\*&]+)\s+([A-Za-z_][\w]*(?:::[A-Za-z_][\w]*)?)\s*\([^;{)]*\)\s*\{'),
+    },
+    # C#
+    'csharp': {
+        'class': re.compile(r'^[+\-]\s*(?:public|private|protected|internal|sealed|abstract|partial|static)?\s*class\s+([A-Za-z_][\w]*)'),
+        'method': re.compile(r'^[+\-]\s*(?:public|private|protected|internal|static|virtual|override|sealed|async|extern|unsafe|new|partial|readonly|ref|in|out)?\s*[\w<>,\[\]\s\?]+\s+([A-Za-z_][\w]*)\s*\([^;{)]*\)\s*\{'),
+    },
+    # For CSS/HTML we do not extract symbols; fallback to header/keyword context
+}
+
+
+# Substrings every declaration pattern of a language requires (functions and
+# methods need '(', classes/structs need their keyword); used as a prefilter
+_DECL_MARKERS: dict[str, tuple[str, ...]] = {
+    'python': ('(', 'class'),
+    'javascript': ('(', 'class'),
+    'typescript': ('(', 'class'),
+    'java': ('(', 'class'),
+    'go': ('(', 'struct'),
+    'apex': ('(', 'class'),
+    'c': ('(',),
+    'cpp': ('(', 'class', 'struct'),
+    'csharp': ('(', 'class'),
+}
+
+# Generated, minified and binary files: patches are noise with no declarations
+_SKIP_SUFFIXES = (
+    '.lock', '.sum', '.min.js', '.min.css', '.map',
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.pdf', '.ico', '.woff', '.woff2',
+)
+_SKIP_NAMES = frozenset({'package-lock.json', 'yarn.lock', 'poetry.lock', 'Cargo.lock', 'go.sum'})
+
+# Bound the work spent on a single file's patch (usually generated code)
+_MAX_PATCH_CHARS = 500_000
+_MAX_PATCH_LINES = 5000
+
+
+# Upper bound on concurrent per-commit fetches in get_latest_commit_with_diff
+_MAX_COMMIT_WORKERS = 8
+
+# ------------------------------
+# Repository metadata cache
+# ------------------------------
+_REPO_META_TTL = 300  # seconds
+_REPO_META_MAX_ENTRIES = 2048
+_MAX_REPO_META_WORKERS = 16
+# Keyed by (credential scope, repo full name, field): what a repository exposes
+# (private data, collaborators) depends on whose token fetched it
+_repo_meta_cache: dict[tuple[str, str, str], tuple[float, Any]] = {}
+_repo_meta_lock = threading.Lock()
+
+# Fields not present in the repository listing payload; each costs one REST
+# request (or paginated listing) per repo, so callers must opt in
+_REPO_META_FETCHERS: dict[str, Callable[[Any], Any]] = {
+    'subscribers': lambda repo: repo.subscribers_count,
+    'languages': lambda repo: repo.get_languages(),
+    'contributors': lambda repo: [c.login for c in repo.get_contributors(anon="true")],
+    'topics': lambda repo: repo.get_topics(),
+    'collaborators': lambda repo: [c.login for c in repo.get_collaborators()],
+    'branches': lambda repo: [b.name for b in repo.get_branches()],
+}
+
+
+def _repo_meta_scope(access_token: str | None) -> str:
+    """Cache scope for a credential: a digest of the token, never the token itself."""
+    if not access_token:
+        return ''
+    return hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+
+
+def _get_repo_meta(repo: Any, field_name: str, scope: str) -> Any:
+    """Return a per-repo metadata field, refetching it after `_REPO_META_TTL` seconds.
+
+    Entries are only shared between callers with the same credential `scope`
+    (see `_repo_meta_scope`). Safe to call from worker threads.
+    """
+    key = (scope, repo.full_name, field_name)
+    entry = _repo_meta_cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < _REPO_META_TTL:
+        return entry[1]
+    value = _REPO_META_FETCHERS[field_name](repo)
+    with _repo_meta_lock:
+        _repo_meta_cache.pop(key, None)
+        _repo_meta_cache[key] = (time.monotonic(), value)
+        if len(_repo_meta_cache) > _REPO_META_MAX_ENTRIES:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            del _repo_meta_cache[next(iter(_repo_meta_cache))]
+    return value
+
+
+# ------------------------------
+# GraphQL queries
+# ------------------------------
+_GRAPHQL_URL = 'https://api.github.com/graphql'
+_GRAPHQL_MAX_PAGE = 100
+
+_HISTORY_FIELDS = '''
+    defaultBranchRef {
+      target {
+        ... on Commit {
+          history(first: $first, since: $since) {
+            nodes { oid message url author { name date } }
+          }
+        }
+      }
+    }
+'''
+
+_RECENT_COMMITS_QUERY = (
+    'query($owner: String!, $name: String!, $first: Int!, $since: GitTimestamp!) {'
+    '  repository(owner: $owner, name: $name) {' + _HISTORY_FIELDS + '}'
+    '}'
+)
+
+# Used when the owner login is unknown: resolves the viewer in the same request
+_VIEWER_RECENT_COMMITS_QUERY = (
+    'query($name: String!, $first: Int!, $since: GitTimestamp!) {'
+    '  viewer { repository(name: $name) {' + _HISTORY_FIELDS + '} }'
+    '}'
+)
+
+
+_UTC = timezone.utc
+
+
+def _iso_utc(dt: datetime | None) -> str | None:
+    """Format a commit timestamp as ISO 8601 in UTC; naive datetimes are taken as UTC."""
+    if dt is None:
+        return None
+    return (dt.astimezone(_UTC) if dt.tzinfo else dt.replace(tzinfo=_UTC)).isoformat()
+
+
+def _iter_lines(text: str) -> Iterator[str]:
+    """Yield the lines of `text` one at a time without building a list."""
+    start = 0
+    while True:
+        nl = text.find('\n', start)
+        if nl < 0:
+            yield text[start:]
+            return
+        # Tolerate CRLF patches the way str.splitlines() did
+        end = nl - 1 if nl > start and text[nl - 1] == '\r' else nl
+        yield text[start:end]
+        start = nl + 1
+
+
+def _combine_patterns(patterns: dict[str, re.Pattern[str]]) -> tuple[re.Pattern[str], frozenset[int]]:
+    """Join per-kind patterns into one alternation with a named group per kind.
+
+    Returns the combined pattern and the indices of the kind groups, so callers
+    can pick the symbol name out of the remaining (inner) groups.
+    """
+    source = '|'.join(f'(?P<{kind}>{p.pattern})' for kind, p in patterns.items())
+    try:
+        combined = _re_engine.compile(source)
+    except _re_engine.error:
+        # re2 rejects a few constructs the stdlib accepts; keep `re` for those
+        combined = re.compile(source)
+    return combined, frozenset(combined.groupindex.values())
+
+
+_LANG_COMBINED: dict[str, tuple[re.Pattern[str], frozenset[int]]] = {
+    lang: _combine_patterns(patterns) for lang, patterns in _LANG_PATTERNS.items()
+}
+
+
 class GitHubUser(BaseModel):      # Represents a GitHub user
     """GitHub user information"""
 
@@ -38,6 +280,7 @@ class GitHubRepository(BaseModel): # Represents a GitHub repository with key met
     forks: int | None = None
     subscribers: int | None = None
     open_issues: int | None= None
+    language: str | None = None  # primary language, from the listing payload
     languages: dict[str, int] | None = None
     contributors: list[str] | None = None
     topics: list[str] | None = None
@@ -46,13 +289,14 @@ class GitHubRepository(BaseModel): # Represents a GitHub repository with key met
     has_wiki: bool | None = None
 
 
-class GitHubCommit(BaseModel): # Represents a commit in a repository
+@dataclass(slots=True)
+class GitHubCommit: # Represents a commit in a repository
     """GitHub commit information"""
 
     sha: str
     message: str
-    author: str
-    date: str
+    author: str | None
+    date: str | None
     url: str
 
 
@@ -65,7 +309,8 @@ class GitHubResponse(BaseModel):
     error_message: str | None = None
 
 
-class ModifiedSymbol(BaseModel):
+@dataclass(slots=True)
+class ModifiedSymbol:
     """Represents a function/class symbol modified within a diff patch"""
 
     name: str
@@ -74,7 +319,8 @@ class ModifiedSymbol(BaseModel):
     file: str
 
 
-class DiffFileChange(BaseModel):
+@dataclass(slots=True)
+class DiffFileChange:
     """Represents a file changed in a commit with parsed symbols"""
 
     filename: str
@@ -83,19 +329,22 @@ class DiffFileChange(BaseModel):
     deletions: int | None = None
     changes: int | None = None
     patch: str | None = None
-    modified_symbols: list[ModifiedSymbol] = Field(default_factory=list)
+    modified_symbols: list[ModifiedSymbol] = field(default_factory=list)
+    truncated: bool = False  # patch too large to parse in full
 
-class CommitSummary(BaseModel):
+@dataclass(slots=True)
+class CommitSummary:
     """Summary statistics for a commit"""
     files_changed: int | None = None
     total_additions: int | None = None
     total_deletions: int | None = None
     total_changes: int | None = None
     
-class CommitWithFiles(BaseModel):
+@dataclass(slots=True)
+class CommitWithFiles:
     """Response model for commit diff and parsed symbols"""
     commit: GitHubCommit | None = None
-    files: list[DiffFileChange] = Field(default_factory=list)
+    files: list[DiffFileChange] = field(default_factory=list)
     summary: CommitSummary | None = None
 
 class CommitDiffResponse(GitHubResponse):
@@ -121,23 +370,34 @@ class GitHubToolset:
     def __init__(self, user_id: Optional[str] = None):
         self._github_client = None
         self._user_id = user_id
+        self._oauth_token: Optional[OAuthToken] = None
+        self._owner_login: Optional[str] = None
+
+    def _get_oauth_token(self) -> Optional[OAuthToken]:
+        """Look up the user's OAuth token once per toolset; a miss is retried on the next call."""
+        if self._oauth_token is None and self._user_id:
+            self._oauth_token = token_storage.get_token(self._user_id)
+        return self._oauth_token
 
     def _get_github_client(self) -> Github:
         """Get GitHub client using OAuth token or fallback to environment token.
 
         Priority:
-        1. OAuth token from user_id (if provided)
-        2. GITHUB_TOKEN environment variable (fallback)
+        1. OAuth token from user_id (if provided; required when a user_id is set)
+        2. GITHUB_TOKEN environment variable (fallback, only without a user_id)
         3. Unauthenticated client (public data only)
         """
         if self._github_client is None:
             # Try OAuth token first
+            oauth_token = self._get_oauth_token()
+            if oauth_token and oauth_token.access_token:
+                auth = Auth.Token(oauth_token.access_token)
+                self._github_client = Github(auth=auth)
+                return self._github_client
+
+            # A user's requests must never run as the server's token or anonymously
             if self._user_id:
-                oauth_token = token_storage.get_token(self._user_id)
-                if oauth_token and oauth_token.access_token:
-                    auth = Auth.Token(oauth_token.access_token)
-                    self._github_client = Github(auth=auth)
-                    return self._github_client
+                raise ValueError(f'No GitHub OAuth token for user {self._user_id}; please log in again')
             
             # Fallback to environment token
             github_token = os.getenv('GITHUB_TOKEN')
@@ -149,108 +409,110 @@ class GitHubToolset:
                 self._github_client = Github()
         return self._github_client
 
+    def _resolve_owner_login(self) -> str:
+        """Resolve the authenticated user's login once per toolset.
+
+        Prefers the login stored with the OAuth token and only falls back to
+        the `/user` API call when it is unknown.
+        """
+        if self._owner_login is None:
+            oauth_token = self._get_oauth_token()
+            if oauth_token and oauth_token.user_login:
+                self._owner_login = oauth_token.user_login
+            else:
+                self._owner_login = self._get_github_client().get_user().login
+        return self._owner_login
+
+    def _get_access_token(self) -> str | None:
+        """Return the token `_get_github_client` authenticates with, if any."""
+        oauth_token = self._get_oauth_token()
+        if oauth_token and oauth_token.access_token:
+            return oauth_token.access_token
+        if self._user_id:
+            return None
+        return os.getenv('GITHUB_TOKEN')
+
+    def _gql(self, access_token: str, query: str, variables: dict[str, Any]) -> dict[str, Any]:
+        """Run a GitHub GraphQL query and return its `data` payload."""
+        response = requests.post(
+            _GRAPHQL_URL,
+            json={'query': query, 'variables': variables},
+            headers={'Authorization': f'bearer {access_token}'},
+            timeout=10,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get('errors'):
+            raise ValueError(payload['errors'][0].get('message', 'GraphQL query failed'))
+        return payload['data']
+
+    def _get_recent_commits_graphql(
+        self, access_token: str, repo_name: str, since: datetime, limit: int
+    ) -> list[GitHubCommit]:
+        """Fetch recent default-branch commits in a single GraphQL request."""
+        variables: dict[str, Any] = {'name': repo_name, 'first': limit, 'since': since.isoformat()}
+        oauth_token = self._get_oauth_token()
+        owner_login = self._owner_login or (oauth_token.user_login if oauth_token else None)
+        if owner_login:
+            variables['owner'] = owner_login
+            repository = self._gql(access_token, _RECENT_COMMITS_QUERY, variables)['repository']
+        else:
+            repository = self._gql(access_token, _VIEWER_RECENT_COMMITS_QUERY, variables)['viewer']['repository']
+
+        if repository is None:
+            raise ValueError(f'Repository {repo_name} not found')
+        branch = repository['defaultBranchRef']
+        if branch is None:  # Empty repository
+            return []
+
+        commits = []
+        for node in branch['target']['history']['nodes']:
+            author = node.get('author') or {}
+            date = author.get('date')
+            commits.append(
+                GitHubCommit(
+                    sha=node['oid'][:8],
+                    message=node['message'],
+                    author=author.get('name'),
+                    date=_iso_utc(datetime.fromisoformat(date)) if date else None,
+                    url=node['url'],
+                )
+            )
+        return commits
+
     # ------------------------------
     # Diff and symbol parsing helpers
     # ------------------------------
-    def _infer_language_from_filename(self, filename: str) -> str:
-        lower = filename.lower()
-        if lower.endswith('.py'):
-            return 'python'
-        if lower.endswith('.ts') or lower.endswith('.tsx'):
-            return 'typescript'
-        if lower.endswith('.js') or lower.endswith('.jsx'):
-            return 'javascript'
-        if lower.endswith('.java'):
-            return 'java'
-        if lower.endswith('.go'):
-            return 'go'
-        if lower.endswith('.cls') or lower.endswith('.trigger') or lower.endswith('.apex'):
-            return 'apex'
-        if lower.endswith('.css'):
-            return 'css'
-        if lower.endswith('.html') or lower.endswith('.htm'):
-            return 'html'
-        if lower.endswith('.c'):
-            return 'c'
-        if lower.endswith('.cpp') or lower.endswith('.cc') or lower.endswith('.cxx') or lower.endswith('.hpp') or lower.endswith('.hh') or lower.endswith('.hxx'):
-            return 'cpp'
-        if lower.endswith('.cs'):
-            return 'csharp'
-        if lower.endswith('.h'):
-            return 'c'
-        return 'unknown'
-
-    def _parse_symbols_from_patch(self, filename: str, patch: str | None) -> list[ModifiedSymbol]:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _infer_language_from_filename(filename: str) -> str:
+        # Cached across instances: the same paths recur from commit to commit
+        return _EXT_TO_LANG.get(os.path.splitext(filename)[1].lower(), 'unknown')
+
+    def _parse_symbols_from_patch(
+        self, filename: str, patch: str | None
+    ) -> tuple[list[ModifiedSymbol], bool]:
         """Parse modified function/class symbols from a unified diff patch.
 
         Heuristic, language-aware parsing for: Python, JS/TS, Java, Go, Apex, C, C++, C#.
-        Falls back to hunk headers and keyword detection.
+        Falls back to hunk headers and keyword detection. Returns the symbols and
+        whether the patch was cut short by `_MAX_PATCH_CHARS` / `_MAX_PATCH_LINES`.
         """
         if not patch:
-            return []
-
-        import re
+            return [], False
+        if len(patch) > _MAX_PATCH_CHARS:
+            return [], True
 
         language = self._infer_language_from_filename(filename)
-        symbols: list[ModifiedSymbol] = []
-
-        # Capture function context from hunk headers: @@ ... function signature ... @@
-        hunk_header_re = re.compile(r'^@@.*?@@\s*(.*)$')
-
-        # Language-specific regexes for added/removed declarations
-        patterns_by_lang: dict[str, dict[str, re.Pattern[str]]] = {
-            'python': {
-                'func': re.compile(r'^[+\-]\s*def\s+([A-Za-z_][A-Za-z0-9_]*)\s*\('),
-                'class': re.compile(r'^[+\-]\s*class\s+([A-Za-z_][A-Za-z0-9_]*)\s*[:\(]'),
-                'method': re.compile(r'^[+\-]\s*def\s+([A-Za-z_][A-Za-z0-9_]*)\s*\('),
-            },
-            'javascript': {
-                'func': re.compile(r'^[+\-]\s*(?:function\s+([A-Za-z_$][\w$]*)\s*\(|const\s+([A-Za-z_$][\w$]*)\s*=\s*\([^)]*\)\s*=>|([A-Za-z_$][\w$]*)\s*=\s*function\s*\()'),
-                'class': re.compile(r'^[+\-]\s*class\s+([A-Za-z_$][\w$]*)\s*'),
-                'method': re.compile(r'^[+\-]\s*([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*\{'),
-            },
-            'typescript': {
-                'func': re.compile(r'^[+\-]\s*(?:function\s+([A-Za-z_$][\w$]*)\s*\(|const\s+([A-Za-z_$][\w$]*)\s*=\s*\([^)]*\)\s*=>)'),
-                'class': re.compile(r'^[+\-]\s*class\s+([A-Za-z_$][\w$]*)\s*'),
-                'method': re.compile(r'^[+\-]\s*(?:public|private|protected|static|readonly|async)?\s*([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*\{'),
-            },
-            'java': {
-                'func': re.compile(r'^[+\-]\s*(?:public|private|protected|static|final|synchronized|native|abstract|default)?\s*[\w\<\>\[\]]+\s+([a-zA-Z_][\w]*)\s*\('),
-                'class': re.compile(r'^[+\-]\s*(?:public|private|protected)?\s*(?:final\s+)?class\s+([A-Za-z_][\w]*)'),
-                'method': re.compile(r'^[+\-]\s*(?:public|private|protected|static|final|synchronized|native|abstract|default)?\s*[\w\<\>\[\]]+\s+([a-zA-Z_][\w]*)\s*\('),
-            },
-            'go': {
-                'func': re.compile(r'^[+\-]\s*func\s+(?:\([^)]*\)\s*)?([A-Za-z_][\w]*)\s*\('),
-                'class': re.compile(r'\bstruct\b\s+([A-Za-z_][\w]*)'),
-                'method': re.compile(r'^[+\-]\s*func\s*\([^)]*\)\s*([A-Za-z_][\w]*)\s*\('),
-            },
-            # Apex (Salesforce): classes, methods, and triggers
-            'apex': {
-                'class': re.compile(r'^[+\-]\s*(?:global|public|private|protected)?\s*class\s+([A-Za-z_][\w]*)'),
-                'method': re.compile(r'^[+\-]\s*(?:global|public|private|protected|static|virtual|override|abstract|testmethod)?\s*[\w<>,\[\]\s]+\s+([A-Za-z_][\w]*)\s*\('),
-                'func': re.compile(r'^[+\-]\s*trigger\s+([A-Za-z_][\w]*)\s+on\s+[A-Za-z_][\w]*\s*\('),
-            },
-            # C (heuristic): functions
-            'c': {
-                'func': re.compile(r'^[+\-]\s*(?:[A-Za-z_][\w\s\*]*\s+)+([A-Za-z_][\w]*)\s*\([^;]*\)\s*\{'),
-            },
-            # C++ (heuristic): classes/structs and functions/methods (including scope ::)
-            'cpp': {
-                'class': re.compile(r'^[+\-]\s*(?:template\s*<[^>]+>\s*)?(?:class|struct)\s+([A-Za-z_][\w]*)'),
-                'func': re.compile(r'^[+\-]\s*(?:[\w:<>,\s\*&]+)\s+([A-Za-z_][\w]*(?:::[A-Za-z_][\w]*)?)\s*\([^;{)]*\)\s*\{'),
-                'method': re.compile(r'^[+\-]\s*(?:[\w:<>,\s\*&]+)\s+([A-Za-z_][\w]*(?:::[A-Za-z_][\w]*)?)\s*\([^;{)]*\)\s*\{'),
-            },
-            # C#
-            'csharp': {
-                'class': re.compile(r'^[+\-]\s*(?:public|private|protected|internal|sealed|abstract|partial|static)?\s*class\s+([A-Za-z_][\w]*)'),
-                'method': re.compile(r'^[+\-]\s*(?:public|private|protected|internal|static|virtual|override|sealed|async|extern|unsafe|new|partial|readonly|ref|in|out)?\s*[\w<>,\[\]\s\?]+\s+([A-Za-z_][\w]*)\s*\([^;{)]*\)\s*\{'),
-            },
-            # For CSS/HTML we do not extract symbols; fallback to header/keyword context
-        }
+        # Scan into bare (name, kind, change_type) keys; the dict de-duplicates
+        # while keeping first-seen order, and models are built only for survivors
+        found: dict[tuple[str, str, str], None] = {}
 
-        lang_patterns = patterns_by_lang.get(language, {})
+        combined = _LANG_COMBINED.get(language)
+        markers = _DECL_MARKERS.get(language, ('(',))
 
-        for line in patch.splitlines():
+        lines = _iter_lines(patch)
+        for line in islice(lines, _MAX_PATCH_LINES):
             change_type = 'modified'
             if line.startswith('+') and not line.startswith('+++'):
                 change_type = 'added'
@@ -259,45 +521,98 @@ class GitHubToolset:
 
             # Hunk header context capture (best-effort)
             if line.startswith('@@'):
-                m = hunk_header_re.match(line)
+                m = _HUNK_HEADER_RE.match(line)
                 if m:
                     context = m.group(1).strip()
                     if context:
                         # Try to extract symbol name from context
-                        context_name_match = re.search(r'([A-Za-z_$][\w$]*)\s*\(', context)
+                        context_name_match = _CONTEXT_NAME_RE.search(context)
                         if context_name_match:
-                            symbols.append(
-                                ModifiedSymbol(
-                                    name=context_name_match.group(1),
-                                    kind='unknown',
-                                    change_type='modified',
-                                    file=filename,
-                                )
-                            )
+                            found[(context_name_match.group(1), 'unknown', 'modified')] = None
                 continue
 
-            # Language-specific declarations
-            for kind, pattern in lang_patterns.items():
-                m = pattern.match(line)
-                if m:
-                    name = next((g for g in m.groups() if g), None)
-                    if name:
-                        symbols.append(
-                            ModifiedSymbol(
-                                name=name,
-                                kind='method' if kind == 'method' else ('class' if kind == 'class' else 'function'),
-                                change_type=change_type,
-                                file=filename,
-                            )
-                        )
-                    break
-        # De-duplicate by (file, name, kind, change_type)
-        unique: dict[tuple[str, str, str, str], ModifiedSymbol] = {}
-        for s in symbols:
-            key = (s.file, s.name, s.kind, s.change_type)
-            unique[key] = s
-        return list(unique.values())
+            # Only added/removed lines carrying a declaration marker can match
+            # a language pattern; skip everything else before touching the regex
+            if combined is None or not line or line[0] not in '+-':
+                continue
+            if not any(marker in line for marker in markers):
+                continue
 
+            # Language-specific declarations: one match against the combined pattern,
+            # the first alternative that fires names the kind
+            pattern, kind_groups = combined
+            m = pattern.match(line)
+            if m:
+                kind = m.lastgroup
+                name = next((g for i, g in enumerate(m.groups(), 1) if g and i not in kind_groups), None)
+                if name:
+                    kind = 'method' if kind == 'method' else ('class' if kind == 'class' else 'function')
+                    found[(name, kind, change_type)] = None
+
+        # islice stops right at the limit, so anything left unread was cut off;
+        # a lone empty line is just the patch's trailing newline
+        tail = next(lines, None)
+        truncated = tail is not None and (tail != '' or next(lines, None) is not None)
+        symbols = [
+            ModifiedSymbol(name=name, kind=kind, change_type=change_type, file=filename)
+            for name, kind, change_type in found
+        ]
+        return symbols, truncated
+
+
+    def _build_file_changes(self, commit: Any) -> tuple[list[DiffFileChange], CommitSummary]:
+        """Build the changed-file models and summary totals for a PyGithub commit."""
+        files: list[DiffFileChange] = []
+        stats: list[tuple[int, int, int]] = []
+        for f in commit.files:
+            # Read each lazily-completed attribute once
+            filename = f.filename
+            patch = getattr(f, 'patch', None)
+            additions = getattr(f, 'additions', None)
+            deletions = getattr(f, 'deletions', None)
+            changes = getattr(f, 'changes', None)
+
+            stats.append((additions or 0, deletions or 0, changes or 0))
+
+            # Lockfiles and minified files are skipped on purpose, not truncated
+            if filename.lower().endswith(_SKIP_SUFFIXES) or os.path.basename(filename) in _SKIP_NAMES:
+                modified_symbols, truncated = [], False
+            else:
+                modified_symbols, truncated = self._parse_symbols_from_patch(filename, patch)
+
+            files.append(
+                DiffFileChange(
+                    filename=filename,
+                    status=getattr(f, 'status', None),
+                    additions=additions,
+                    deletions=deletions,
+                    changes=changes,
+                    patch=patch,
+                    modified_symbols=modified_symbols,
+                    truncated=truncated,
+                )
+            )
+        total_additions, total_deletions, total_changes = map(sum, zip(*stats)) if stats else (0, 0, 0)
+        summary = CommitSummary(
+            files_changed=len(files),
+            total_additions=total_additions,
+            total_deletions=total_deletions,
+            total_changes=total_changes,
+        )
+        return files, summary
+
+    def _build_commit_with_files(self, commit: Any) -> CommitWithFiles:
+        """Build commit metadata plus its changed files for a PyGithub commit."""
+        author = commit.commit.author
+        commit_model = GitHubCommit(
+            sha=commit.sha[:8],
+            message=commit.commit.message,
+            author=author.name if author else None,
+            date=_iso_utc(author.date if author else None),
+            url=commit.html_url,
+        )
+        files, summary = self._build_file_changes(commit)
+        return CommitWithFiles(commit=commit_model, files=files, summary=summary)
 
     # ------------------------------
     # Public tools
@@ -319,78 +634,22 @@ class GitHubToolset:
         try:
             github = self._get_github_client()
             
-            # Get authenticated user or use provided username
-            if self._user_id:
-                oauth_token = token_storage.get_token(self._user_id)
-                if oauth_token and oauth_token.user_login:
-                    owner_login = oauth_token.user_login
-                else:
-                    authenticated_user = github.get_user()
-                    owner_login = authenticated_user.login
-            else:
-                authenticated_user = github.get_user()
-                owner_login = authenticated_user.login
-                
-            repo = github.get_repo(f"{owner_login}/{repo_name}")  # Exposes commits, issues, files, etc.
-
-            # Get the most recent `limit` commits
-            commits = repo.get_commits()[:limit]
-
-            commit_with_files = []
-            for commit in commits:
-                
-                # Commit metadata
-                commit_model = GitHubCommit(
-                    sha=commit.sha[:8],
-                    message=commit.commit.message,
-                    author=commit.commit.author.name if commit.commit.author else None,
-                    date=(
-                        commit.commit.author.date.astimezone(timezone.utc).isoformat()
-                        if commit.commit.author and commit.commit.author.date.tzinfo
-                        else commit.commit.author.date.replace(tzinfo=timezone.utc).isoformat()
-                        if commit.commit.author else None
-                    ),
-                    url=commit.html_url,
-                )
+            repo = github.get_repo(f"{self._resolve_owner_login()}/{repo_name}")  # Exposes commits, issues, files, etc.
 
-                # Files changed in this commit
-                files: list[DiffFileChange] = []
-                total_additions = total_deletions = total_changes = 0
-                for f in commit.files:
-                    symbols = self._parse_symbols_from_patch(f.filename, getattr(f, 'patch', None)) or []
-                    additions = getattr(f, "additions", 0) or 0
-                    deletions = getattr(f, "deletions", 0) or 0
-                    changes = getattr(f, "changes", 0) or 0
-
-                    total_additions += additions
-                    total_deletions += deletions
-                    total_changes += changes
-                    
-                    files.append(
-                        DiffFileChange(
-                            filename=f.filename,
-                            status=getattr(f, 'status', None),
-                            additions=getattr(f, 'additions', None),
-                            deletions=getattr(f, 'deletions', None),
-                            changes=getattr(f, 'changes', None),
-                            patch=getattr(f, 'patch', None),
-                            modified_symbols=symbols or [],
-                        )
-                    )
-                summary = CommitSummary(
-                    files_changed=len(files),
-                    total_additions=total_additions,
-                    total_deletions=total_deletions,
-                    total_changes=total_changes,
-                )
-                commit_with_files.append(
-                    CommitWithFiles(
-                        commit=commit_model,
-                        files=files,
-                        summary=summary
-                    )
-                )
+            # Get the most recent `limit` commits; when they fit in one page, fetch
+            # exactly that page instead of iterating the paginated list
+            if limit <= github.per_page:
+                commits = repo.get_commits().get_page(0)[:limit]
+            else:
+                commits = list(repo.get_commits()[:limit])
 
+            # Each commit's files come from its own /commits/{sha} request, so fetch
+            # and parse commits concurrently; results keep the listing order
+            if len(commits) > 1:
+                with ThreadPoolExecutor(max_workers=min(_MAX_COMMIT_WORKERS, len(commits))) as executor:
+                    commit_with_files = list(executor.map(self._build_commit_with_files, commits))
+            else:
+                commit_with_files = [self._build_commit_with_files(c) for c in commits]
 
             return CommitDiffResponse(
                 status='success',
@@ -421,70 +680,10 @@ class GitHubToolset:
         try:
             github = self._get_github_client()
             
-            # Get authenticated user or use provided username
-            if self._user_id:
-                oauth_token = token_storage.get_token(self._user_id)
-                if oauth_token and oauth_token.user_login:
-                    owner_login = oauth_token.user_login
-                else:
-                    authenticated_user = github.get_user()
-                    owner_login = authenticated_user.login
-            else:
-                authenticated_user = github.get_user()
-                owner_login = authenticated_user.login
-                
-            repo = github.get_repo(f"{owner_login}/{repo_name}")
+            repo = github.get_repo(f"{self._resolve_owner_login()}/{repo_name}")
             commit = repo.get_commit(sha=sha)
 
-            commit_with_files= []
-            commit_model = GitHubCommit(
-                sha=commit.sha[:8],
-                message=commit.commit.message,
-                author=commit.commit.author.name,
-                date=(
-                    commit.commit.author.date.astimezone(timezone.utc).isoformat()
-                    if commit.commit.author.date.tzinfo
-                    else commit.commit.author.date.replace(tzinfo=timezone.utc).isoformat()
-                ),
-                url=commit.html_url,
-            )
-
-            files: list[DiffFileChange] = []
-            total_additions = total_deletions = total_changes = 0
-            for f in commit.files:
-                symbols = self._parse_symbols_from_patch(f.filename, getattr(f, 'patch', None)) or []
-                additions = getattr(f, "additions", 0) or 0
-                deletions = getattr(f, "deletions", 0) or 0
-                changes = getattr(f, "changes", 0) or 0
-
-                total_additions += additions
-                total_deletions += deletions
-                total_changes += changes
-                files.append(
-                    DiffFileChange(
-                        filename=f.filename,
-                        status=getattr(f, 'status', None),
-                        additions=getattr(f, 'additions', None),
-                        deletions=getattr(f, 'deletions', None),
-                        changes=getattr(f, 'changes', None),
-                        patch=getattr(f, 'patch', None),
-                        modified_symbols=symbols,
-                    )
-                )
-            summary = CommitSummary(
-                    files_changed=len(files),
-                    total_additions=total_additions,
-                    total_deletions=total_deletions,
-                    total_changes=total_changes,
-                )
-            commit_with_files.append(
-                    CommitWithFiles(
-                        commit=commit_model,
-                        files=files,
-                        summary=summary
-                    )
-                )
-
+            commit_with_files = [self._build_commit_with_files(commit)]
 
             return CommitDiffResponse(
                 status='success',
@@ -504,8 +703,9 @@ class GitHubToolset:
         username: str | None = None,
         days: int | None = None,
         limit: int | None = None,
+        fields: set[str] | None = None,
     ) -> RepositoryResponse:
-        """Get user's repositories with recent updates.
+        """Get user's repositories with recent updates (each with its primary language); set `fields` to a comma-separated list of languages, contributors, topics, collaborators, branches, subscribers for more detail.
 
         If `username` is not provided, this method defaults to the authenticated
         user from GITHUB_TOKEN.
@@ -513,6 +713,9 @@ class GitHubToolset:
             username: GitHub username (optional, defaults to authenticated user)
             days: Number of days to look for recent updates (default: 30 days)
             limit: Maximum number of repositories to return (default: 10)
+            fields: Extra per-repo details to fetch, each costing API calls; any of
+                languages, contributors, topics, collaborators, branches, subscribers
+                (comma-separated string accepted; default: none)
 
         Returns:
             RepositoryResponse: Contains status, repository list, and metadata
@@ -530,55 +733,63 @@ class GitHubToolset:
                 user = github.get_user(username)
             else:
                 # Default to the authenticated user
-                if self._user_id:
-                    oauth_token = token_storage.get_token(self._user_id)
-                    if oauth_token and oauth_token.user_login:
-                        user = github.get_user(oauth_token.user_login)
-                    else:
-                        user = github.get_user()
+                oauth_token = self._get_oauth_token()
+                if oauth_token and oauth_token.user_login:
+                    user = github.get_user(oauth_token.user_login)
                 else:
                     user = github.get_user()
 
-            repos = []
+            matching = []
             cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
 
             for repo in user.get_repos(sort='updated', direction='desc'):
-                if len(repos) >= limit:
+                if len(matching) >= limit:
                     break
 
                 # Ensure both datetimes are timezone-aware in UTC
                 repo_updated_at = (
                     repo.updated_at if repo.updated_at.tzinfo else repo.updated_at.replace(tzinfo=timezone.utc)
                 )
-                if repo_updated_at >= cutoff_date:
-                    repos.append(
-                        GitHubRepository(
-                                name=repo.name,
-                                full_name=repo.full_name,
-                                description=repo.description,
-                                url=repo.html_url,
-                                author=repo.owner.login,
-                                license=repo.license.spdx_id if repo.license else None,
-                                private=repo.private,
-                                archived=repo.archived,
-                                default_branch=repo.default_branch,
-                                created_at=repo.created_at.isoformat(),
-                                updated_at=repo.updated_at.isoformat(),
-                                pushed_at=repo.pushed_at.isoformat(),
-                                stars=repo.stargazers_count,
-                                forks=repo.forks_count,
-                                subscribers=repo.subscribers_count,
-                                open_issues=repo.open_issues_count,
-                                languages=repo.get_languages(),
-                                contributors=[c.login for c in repo.get_contributors(anon="true")],
-                                topics=repo.get_topics(),
-                                collaborators=repo.get_collaborators(),
-                                branches=[b.name for b in repo.get_branches()],
-                                has_wiki=repo.has_wiki,
-                                
-                                                )
-
+                if repo_updated_at < cutoff_date:
+                    # Listing is sorted by update time, so every later repo is older too;
+                    # stop instead of paging through the user's whole repository history
+                    break
+                matching.append(repo)
+
+            # Expensive metadata is opt-in; each field is one independent request per repo
+            if isinstance(fields, str):
+                fields = {f.strip() for f in fields.split(',')}
+            requested = [name for name in _REPO_META_FETCHERS if name in (fields or ())]
+
+            scope = _repo_meta_scope(self._get_access_token())
+            with ThreadPoolExecutor(max_workers=_MAX_REPO_META_WORKERS) as executor:
+                meta_futures = [
+                    {name: executor.submit(_get_repo_meta, repo, name, scope) for name in requested}
+                    for repo in matching
+                ]
+                repos = [
+                    GitHubRepository(
+                        name=repo.name,
+                        full_name=repo.full_name,
+                        description=repo.description,
+                        url=repo.html_url,
+                        author=repo.owner.login,
+                        license=repo.license.spdx_id if repo.license else None,
+                        private=repo.private,
+                        archived=repo.archived,
+                        default_branch=repo.default_branch,
+                        created_at=repo.created_at.isoformat(),
+                        updated_at=repo.updated_at.isoformat(),
+                        pushed_at=repo.pushed_at.isoformat(),
+                        stars=repo.stargazers_count,
+                        forks=repo.forks_count,
+                        open_issues=repo.open_issues_count,
+                        language=repo.language,
+                        has_wiki=repo.has_wiki,
+                        **{name: future.result() for name, future in futures.items()},
                     )
+                    for repo, futures in zip(matching, meta_futures)
+                ]
 
             return RepositoryResponse(
                 status='success',
@@ -613,23 +824,26 @@ class GitHubToolset:
             limit = 30
 
         try:
+            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
+
+            # One GraphQL round trip resolves the owner and the commit history together
+            access_token = self._get_access_token()
+            if access_token and limit <= _GRAPHQL_MAX_PAGE:
+                try:
+                    commits = self._get_recent_commits_graphql(access_token, repo_name, cutoff_date, limit)
+                    return CommitResponse(
+                        status='success',
+                        data=commits,
+                        count=len(commits),
+                        message=f'Successfully retrieved {len(commits)} commits for repository {repo_name} in the last {days} days',
+                    )
+                except Exception:
+                    pass  # Fall back to the REST API below
+
             github = self._get_github_client()
 
-            # Get authenticated user or use provided username
-            if self._user_id:
-                oauth_token = token_storage.get_token(self._user_id)
-                if oauth_token and oauth_token.user_login:
-                    owner_login = oauth_token.user_login
-                else:
-                    authenticated_user = github.get_user()
-                    owner_login = authenticated_user.login
-            else:
-                authenticated_user = github.get_user()
-                owner_login = authenticated_user.login
-                
-            repo = github.get_repo(f"{owner_login}/{repo_name}")
+            repo = github.get_repo(f"{self._resolve_owner_login()}/{repo_name}")
             commits = []
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
 
             for commit in repo.get_commits(since=cutoff_date):
                 if len(commits) >= limit:
@@ -640,11 +854,7 @@ class GitHubToolset:
                         sha=commit.sha[:8],
                         message=commit.commit.message,
                         author=commit.commit.author.name,
-                        date=(
-                            commit.commit.author.date.astimezone(timezone.utc).isoformat()
-                            if commit.commit.author.date.tzinfo
-                            else commit.commit.author.date.replace(tzinfo=timezone.utc).isoformat()
-                        ),
+                        date=_iso_utc(commit.commit.author.date),
                         url=commit.html_url,
                     )
                 )
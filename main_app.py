@@ -10,17 +10,24 @@ This is the main application that integrates:
 """
 
 import os
+import html
 import json
 import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from typing import Optional, Dict, Any
-from datetime import datetime
 import asyncio
 from fastapi import FastAPI, Request, HTTPException, Depends, Form, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, RedirectResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from pydantic import BaseModel, ValidationError
+from cachetools import TTLCache
 import httpx
 from dotenv import load_dotenv
 
@@ -28,6 +35,11 @@ from dotenv import load_dotenv
 from github_oauth import token_storage, GitHubOAuth
 from simple_agent_executor import SimpleGitHubAgent
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional; without it state stays in-process
+    aioredis = None
+
 # Load environment variables
 load_dotenv()
 
@@ -35,33 +47,108 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CACHE_SWEEP_INTERVAL = 60  # seconds
+
+async def _expire_caches_periodically() -> None:
+    """Release expired in-memory sessions, states and agents off the request path"""
+    while True:
+        await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+        sessions.expire()
+        oauth_states.expire()
+        _agents.expire()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the cache sweeper for the lifetime of the app and close shared clients on shutdown"""
+    sweeper = asyncio.create_task(_expire_caches_periodically())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        await oauth_handler.aclose()
+        await SimpleGitHubAgent.aclose()
+
 # Create FastAPI app
 app = FastAPI(
     title="GitHub Agent Chat",
     description="AI-powered GitHub repository assistant with OAuth authentication",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# The bundled UI is served from this app (same origin) and needs no CORS; only add
+# the middleware for explicitly listed external frontends (comma-separated)
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "").split(",") if origin.strip()]
+if CORS_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+# Templates for web UI; compiled once and kept, without an mtime check per render
+# (restart the server to pick up template edits)
+templates = Jinja2Templates(env=Environment(
+    loader=FileSystemLoader("templates"),
+    autoescape=True,
+    auto_reload=False,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache()
+))
+
+@lru_cache(maxsize=1)
+def _error_page() -> bytes:
+    """error.html rendered once, with a placeholder where the message goes"""
+    return templates.get_template("error.html").render(error="__ERROR__").encode()
 
-# Templates for web UI
-templates = Jinja2Templates(directory="templates")
+def error_response(message: str) -> HTMLResponse:
+    """Render error.html for `message` by splicing it into the cached page"""
+    return HTMLResponse(_error_page().replace(b"__ERROR__", html.escape(message).encode()))
 
 # OAuth handler
 oauth_handler = GitHubOAuth()
 
-# In-memory session storage (use Redis in production)
-sessions: Dict[str, Dict[str, Any]] = {}
+SESSION_TTL = 86400  # seconds
+SESSION_MAX_SIZE = 50000
+OAUTH_STATE_TTL = 600  # seconds
+OAUTH_STATE_MAX_SIZE = 10000
 
-# OAuth state storage (use Redis in production)
-oauth_states: Dict[str, Dict[str, Any]] = {}
+# Sessions and OAuth states are kept in Redis when REDIS_URL is set (tokens stay in-process)
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL and aioredis is None:
+    raise ImportError("REDIS_URL is set but the 'redis' package is missing. Install it with: pip install redis")
+redis_client = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+
+# LLM API key; the environment doesn't change at runtime
+API_KEY = os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+if not API_KEY:
+    logger.warning("Neither OPENROUTER_API_KEY nor OPENAI_API_KEY is set; chat requests will fail")
+
+AGENT_CACHE_TTL = 900  # seconds
+AGENT_CACHE_MAX_SIZE = 10000
+
+# Bounded in-memory fallbacks used when Redis is not configured; entries expire on their own
+sessions: TTLCache = TTLCache(maxsize=SESSION_MAX_SIZE, ttl=SESSION_TTL)
+oauth_states: TTLCache = TTLCache(maxsize=OAUTH_STATE_MAX_SIZE, ttl=OAUTH_STATE_TTL)
+
+# One agent per user, reused across requests so its API client keeps its connections
+_agents: TTLCache = TTLCache(maxsize=AGENT_CACHE_MAX_SIZE, ttl=AGENT_CACHE_TTL)
+
+# Atomically mark a state used; returns {already_used, original_payload} or nil
+_CLAIM_STATE_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then return nil end
+local data = cjson.decode(raw)
+if data['used'] then return {1, raw} end
+data['used'] = true
+redis.call('SET', KEYS[1], cjson.encode(data), 'KEEPTTL')
+return {0, raw}
+"""
+# Registered once; calls send only the script's SHA (EVALSHA), not its source
+_claim_state_script = redis_client.register_script(_CLAIM_STATE_SCRIPT) if redis_client is not None else None
 
 class ChatMessage(BaseModel):
     message: str
@@ -76,47 +163,126 @@ class UserSession(BaseModel):
     user_id: str
     user_login: str
     authenticated: bool
-    created_at: datetime
-    last_activity: datetime
+    created_at: float  # time.time()
+    last_activity: float
 
-def get_session_id(request: Request) -> str:
-    """Get or create session ID from request"""
-    session_id = request.cookies.get("session_id")
-    if not session_id:
-        import secrets
-        session_id = secrets.token_urlsafe(32)
-    return session_id
+async def parse_chat_message(request: Request) -> ChatMessage:
+    """Validate the raw JSON body in one pydantic-core pass (no stdlib json.loads first)"""
+    try:
+        return ChatMessage.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
+def get_session_id(request: Request) -> Optional[str]:
+    """Get session ID from request; new IDs are only minted by create_user_session"""
+    return request.cookies.get("session_id")
+
+def get_agent(user_id: str) -> SimpleGitHubAgent:
+    """Get the cached agent for a user, creating it on first use or after AGENT_CACHE_TTL"""
+    agent = _agents.get(user_id)
+    if agent is None:
+        # Construction never awaits, so concurrent first requests can't both build one
+        agent = _agents[user_id] = SimpleGitHubAgent(user_id=user_id, api_key=API_KEY)
+    return agent
 
-def get_user_session(session_id: str) -> Optional[UserSession]:
+async def get_user_session(session_id: Optional[str]) -> Optional[UserSession]:
     """Get user session from session ID"""
-    session_data = sessions.get(session_id)
-    if not session_data:
+    if not session_id:
         return None
+    if redis_client is None:
+        # In-process sessions are stored as ready-made models
+        return sessions.get(session_id)
     
-    return UserSession(**session_data)
+    raw = await redis_client.get(f"sess:{session_id}")
+    if not raw:
+        return None
+    # Written by create_user_session, so there is nothing to validate
+    return UserSession.model_construct(**json.loads(raw))
+
+async def current_session(request: Request) -> Optional[UserSession]:
+    """Resolve the request's session once; FastAPI caches it per request"""
+    session_id = get_session_id(request)
+    user_session = await get_user_session(session_id)
+    if user_session is not None and token_storage.get_token(user_session.user_id) is None:
+        # Sessions can outlive the in-process token (restart, token LRU eviction);
+        # drop them so the user logs in again instead of acting without their token
+        await delete_user_session(session_id)
+        _agents.pop(user_session.user_id, None)
+        return None
+    return user_session
+
+async def require_auth(user_session: Optional[UserSession] = Depends(current_session)) -> UserSession:
+    """Dependency for endpoints that need an authenticated user"""
+    if not user_session or not user_session.authenticated:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user_session
 
-def create_user_session(user_id: str, user_login: str) -> str:
+async def create_user_session(user_id: str, user_login: str) -> str:
     """Create a new user session"""
-    import secrets
     session_id = secrets.token_urlsafe(32)
-    now = datetime.now()
+    now = time.time()
     
-    sessions[session_id] = {
-        "user_id": user_id,
-        "user_login": user_login,
-        "authenticated": True,
-        "created_at": now.isoformat(),
-        "last_activity": now.isoformat()
-    }
+    user_session = UserSession(
+        user_id=user_id,
+        user_login=user_login,
+        authenticated=True,
+        created_at=now,
+        last_activity=now
+    )
+    if redis_client is not None:
+        await redis_client.set(f"sess:{session_id}", user_session.model_dump_json(), ex=SESSION_TTL)
+    else:
+        sessions[session_id] = user_session
     
     return session_id
 
+async def delete_user_session(session_id: str) -> None:
+    """Delete a user session"""
+    if redis_client is not None:
+        await redis_client.delete(f"sess:{session_id}")
+    else:
+        sessions.pop(session_id, None)
+
+async def store_oauth_state(state: str, state_data: Dict[str, Any]) -> None:
+    """Store a pending OAuth state; it expires after OAUTH_STATE_TTL"""
+    if redis_client is not None:
+        await redis_client.set(f"oauth_state:{state}", json.dumps(state_data), ex=OAUTH_STATE_TTL, nx=True)
+    else:
+        oauth_states[state] = state_data
+
+async def claim_oauth_state(state: str) -> Optional[tuple[bool, Dict[str, Any]]]:
+    """Mark an OAuth state used, returning (already_used, state_data) or None if unknown"""
+    if redis_client is not None:
+        result = await _claim_state_script(keys=[f"oauth_state:{state}"])
+        if result is None:
+            return None
+        already_used, raw = result
+        return bool(already_used), json.loads(raw)
+    
+    # No await between check and set, so this is atomic on the event loop
+    state_data = oauth_states.get(state)
+    if state_data is None:
+        return None
+    already_used = state_data['used']
+    state_data['used'] = True
+    return already_used, state_data
+
+async def list_oauth_states() -> Dict[str, Dict[str, Any]]:
+    """Return all pending OAuth states (debugging only)"""
+    if redis_client is None:
+        return oauth_states
+    states = {}
+    async for key in redis_client.scan_iter(match="oauth_state:*"):
+        raw = await redis_client.get(key)
+        if raw:
+            states[key.decode().split(":", 1)[1]] = json.loads(raw)
+    return states
+
 @app.get("/", response_class=HTMLResponse)
-async def homepage(request: Request):
+async def homepage(request: Request, user_session: Optional[UserSession] = Depends(current_session)):
     """Main homepage - shows login or chat interface"""
-    session_id = get_session_id(request)
-    user_session = get_user_session(session_id)
-    
     if user_session and user_session.authenticated:
         # User is authenticated, show chat interface
         return templates.TemplateResponse("chat.html", {
@@ -134,29 +300,18 @@ async def homepage(request: Request):
 async def login(request: Request):
     """Initiate GitHub OAuth login"""
     try:
-        auth_url, state = oauth_handler.generate_authorization_url()
-        
-        # Clean up old states (older than 10 minutes) - but be more conservative
-        now = datetime.now()
-        expired_states = []
-        for state_key, state_data in oauth_states.items():
-            if 'created_at' in state_data:
-                created_at = datetime.fromisoformat(state_data['created_at'])
-                if (now - created_at).total_seconds() > 600:  # 10 minutes
-                    expired_states.append(state_key)
-        
-        for expired_state in expired_states:
-            del oauth_states[expired_state]
-            logger.info(f"Cleaned up expired state: {expired_state[:20]}...")
+        code_verifier, code_challenge = oauth_handler.generate_pkce()
+        auth_url, state = oauth_handler.generate_authorization_url(code_challenge=code_challenge)
         
         # Store state in global state store for verification
-        oauth_states[state] = {
-            'created_at': datetime.now().isoformat(),
-            'used': False
+        state_data = {
+            'created_at': time.time(),
+            'used': False,
+            'code_verifier': code_verifier
         }
+        await store_oauth_state(state, state_data)
         
-        logger.info(f"Generated OAuth state: {state[:20]}... (Total states: {len(oauth_states)})")
-        logger.info(f"Stored state data: {oauth_states[state]}")
+        logger.debug("Generated OAuth state: %.20s... created at %s", state, state_data['created_at'])
         return RedirectResponse(url=auth_url)
     except Exception as e:
         logger.error(f"Error initiating OAuth: {e}")
@@ -171,69 +326,51 @@ async def oauth_callback(
 ):
     """Handle GitHub OAuth callback"""
     try:
-        logger.info(f"OAuth callback received - code: {code[:10] if code else 'None'}..., state: {state[:20] if state else 'None'}...")
+        logger.debug("OAuth callback received - code: %.10s..., state: %.20s...", code, state)
         
         if error:
             logger.error(f"OAuth error: {error}")
-            return templates.TemplateResponse("error.html", {
-                "request": request,
-                "error": f"OAuth error: {error}"
-            })
+            return error_response(f"OAuth error: {error}")
         
         if not code:
             logger.error("Authorization code not provided")
-            return templates.TemplateResponse("error.html", {
-                "request": request,
-                "error": "Authentication failed: 400: Authorization code not provided"
-            })
+            return error_response("Authentication failed: 400: Authorization code not provided")
         
         if not state:
             logger.error("State parameter not provided")
-            return templates.TemplateResponse("error.html", {
-                "request": request,
-                "error": "Authentication failed: 400: Invalid state parameter"
-            })
+            return error_response("Authentication failed: 400: Invalid state parameter")
         
         # Verify state using global state store
-        logger.info(f"Available OAuth states: {list(oauth_states.keys())[:3]}...")
-        logger.info(f"Looking for state: {state[:20]}...")
-        
-        if state not in oauth_states:
-            logger.error(f"State {state[:20]}... not found in oauth_states")
-            logger.error(f"Available states: {list(oauth_states.keys())}")
-            return templates.TemplateResponse("error.html", {
-                "request": request,
-                "error": "Authentication failed: 400: Invalid state parameter"
-            })
+        # Check and mark the state used in one step so concurrent callbacks can't both pass
+        claimed = await claim_oauth_state(state)
+        if claimed is None:
+            logger.error("State %.20s... not found", state)
+            return error_response("Authentication failed: 400: Invalid state parameter")
         
-        if oauth_states[state]['used']:
-            logger.error(f"State {state[:20]}... already used")
-            return templates.TemplateResponse("error.html", {
-                "request": request,
-                "error": "Authentication failed: 400: State already used"
-            })
+        already_used, state_data = claimed
+        if already_used:
+            logger.error("State %.20s... already used", state)
+            return error_response("Authentication failed: 400: State already used")
         
-        # Mark state as used
-        oauth_states[state]['used'] = True
-        logger.info(f"State {state[:20]}... marked as used")
+        logger.debug("State %.20s... marked as used", state)
         
         # Exchange code for token
-        token = await oauth_handler.exchange_code_for_token(code, state)
+        token = await oauth_handler.exchange_code_for_token(
+            code, state, code_verifier=state_data.get('code_verifier')
+        )
         
         if not token.user_id or not token.user_login:
             logger.error("Failed to get user information from token")
-            return templates.TemplateResponse("error.html", {
-                "request": request,
-                "error": "Authentication failed: Failed to get user information"
-            })
+            return error_response("Authentication failed: Failed to get user information")
         
         logger.info(f"Token exchange successful for user: {token.user_login}")
         
-        # Store token
+        # Store token; drop any agent still holding the previous one
         token_storage.store_token(token.user_id, token)
+        _agents.pop(token.user_id, None)
         
         # Create user session
-        session_id = create_user_session(token.user_id, token.user_login)
+        session_id = await create_user_session(token.user_id, token.user_login)
         
         # Redirect to homepage with session cookie
         response = RedirectResponse(url="/")
@@ -243,49 +380,46 @@ async def oauth_callback(
         
     except Exception as e:
         logger.error(f"Error in OAuth callback: {e}")
-        return templates.TemplateResponse("error.html", {
-            "request": request,
-            "error": f"Authentication failed: {str(e)}"
-        })
+        return error_response(f"Authentication failed: {str(e)}")
 
 @app.get("/auth/logout")
 async def logout(request: Request):
     """Logout user"""
     session_id = get_session_id(request)
-    user_session = get_user_session(session_id)
+    user_session = await get_user_session(session_id)
     
     if user_session:
-        # Remove token
+        # Remove token and the agent built with it
         token_storage.remove_token(user_session.user_id)
+        _agents.pop(user_session.user_id, None)
         # Remove session
-        sessions.pop(session_id, None)
+        await delete_user_session(session_id)
     
     response = RedirectResponse(url="/")
     response.delete_cookie(key="session_id")
     return response
 
 @app.get("/api/user")
-async def get_user_info(request: Request):
+async def get_user_info(user_session: UserSession = Depends(require_auth)):
     """Get current user information"""
-    session_id = get_session_id(request)
-    user_session = get_user_session(session_id)
-    
-    if not user_session or not user_session.authenticated:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
     return {
         "user_id": user_session.user_id,
         "user_login": user_session.user_login,
         "authenticated": True
     }
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat_with_agent(request: Request, chat_message: ChatMessage):
+@app.post("/api/chat", response_model=ChatResponse, openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": ChatMessage.model_json_schema()}}
+    }
+})
+async def chat_with_agent(
+    chat_message: ChatMessage = Depends(parse_chat_message),
+    user_session: Optional[UserSession] = Depends(current_session)
+):
     """Chat with the GitHub agent"""
     try:
-        session_id = get_session_id(request)
-        user_session = get_user_session(session_id)
-        
         if not user_session or not user_session.authenticated:
             return ChatResponse(
                 response="Please authenticate with GitHub first.",
@@ -293,11 +427,7 @@ async def chat_with_agent(request: Request, chat_message: ChatMessage):
                 error="Not authenticated"
             )
         
-        # Create simplified agent
-        agent = SimpleGitHubAgent(
-            user_id=user_session.user_id,
-            api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
-        )
+        agent = get_agent(user_session.user_id)
         
         # Process the message
         response_text = await agent.chat(chat_message.message)
@@ -315,21 +445,25 @@ async def chat_with_agent(request: Request, chat_message: ChatMessage):
             error=str(e)
         )
 
+@app.post("/api/chat/stream", response_class=StreamingResponse, openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": ChatMessage.model_json_schema()}}
+    }
+})
+async def chat_with_agent_stream(
+    chat_message: ChatMessage = Depends(parse_chat_message),
+    user_session: UserSession = Depends(require_auth)
+):
+    """Chat with the GitHub agent, streaming the reply as plain text while it is generated"""
+    agent = get_agent(user_session.user_id)
+    return StreamingResponse(agent.chat_stream(chat_message.message), media_type="text/plain; charset=utf-8")
+
 @app.get("/api/repositories")
-async def get_user_repositories(request: Request):
+async def get_user_repositories(user_session: UserSession = Depends(require_auth)):
     """Get user's repositories"""
     try:
-        session_id = get_session_id(request)
-        user_session = get_user_session(session_id)
-        
-        if not user_session or not user_session.authenticated:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Create simplified agent to get repositories
-        agent = SimpleGitHubAgent(
-            user_id=user_session.user_id,
-            api_key=os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
-        )
+        agent = get_agent(user_session.user_id)
         
         # Get repositories
         result = await agent.get_user_repositories()
@@ -366,6 +500,7 @@ async def debug_page(request: Request):
 @app.get("/debug/oauth-states")
 async def debug_oauth_states():
     """Debug endpoint to check OAuth states"""
+    oauth_states = await list_oauth_states()
     return {
         "total_states": len(oauth_states),
         "states": {
@@ -389,4 +524,13 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", os.getenv("MAIN_SERVER_PORT", 8000)))
     host = os.getenv("HOST", "0.0.0.0")
     
-    uvicorn.run(app, host=host, port=port)
+    # Single worker: OAuth tokens (github_oauth.token_storage) live in this process
+    # only, even when sessions and OAuth states are shared through Redis.
+    # uvloop event loop and httptools parser (from uvicorn[standard]) instead of asyncio/h11
+    uvicorn.run(
+        app,
+        host=host,
+        port=port,
+        loop="uvloop",
+        http="httptools"
+    )
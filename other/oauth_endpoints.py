@@ -1,14 +1,37 @@
+"""
+Standalone GitHub OAuth server (see doc/OAUTH_SETUP.md)
+
+Runs as its own process on port 8001 and is not mounted into main_app, which
+has its own session-based login flow. The per-user routes here (/auth/users,
+/auth/token/{user_id}, /auth/logout/{user_id}) are unauthenticated, so they
+must not be exposed on the public chat app.
+"""
+
 from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from typing import Optional
 import logging
+from cachetools import TTLCache
 from github_oauth import GitHubOAuth, token_storage, OAuthToken
 
 logger = logging.getLogger(__name__)
 
+# States issued by /auth/login; each may complete one callback before it expires
+OAUTH_STATE_TTL = 600  # seconds
+OAUTH_STATE_MAX_SIZE = 10000
+pending_states: TTLCache = TTLCache(maxsize=OAUTH_STATE_MAX_SIZE, ttl=OAUTH_STATE_TTL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the OAuth handler's pooled GitHub connections on shutdown"""
+    yield
+    await oauth_handler.aclose()
+
+
 # Create FastAPI app for OAuth endpoints
-oauth_app = FastAPI(title="GitHub OAuth", version="1.0.0")
+oauth_app = FastAPI(title="GitHub OAuth", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Add CORS middleware
 oauth_app.add_middleware(
@@ -32,10 +55,11 @@ async def login(request: Request):
     """
     try:
         auth_url, state = oauth_handler.generate_authorization_url()
+        # Remember the state so the callback can check it came from this login;
+        # it is also returned so the frontend can compare it itself
+        pending_states[state] = True
         
-        # Store state in session or return it to frontend
-        # For simplicity, we'll return it in the response
-        return JSONResponse({
+        return ORJSONResponse({
             "auth_url": auth_url,
             "state": state,
             "message": "Redirect user to auth_url to complete authentication"
@@ -66,7 +90,7 @@ async def callback(
     try:
         if error:
             logger.error(f"OAuth error: {error} - {error_description}")
-            return JSONResponse({
+            return ORJSONResponse({
                 "success": False,
                 "error": error,
                 "error_description": error_description
@@ -75,15 +99,24 @@ async def callback(
         if not code:
             raise HTTPException(status_code=400, detail="Authorization code not provided")
         
+        # CSRF check: the state must be one issued by /auth/login, and is consumed here
+        if not state or pending_states.pop(state, None) is None:
+            logger.error("Unknown or already used OAuth state")
+            return ORJSONResponse({
+                "success": False,
+                "error": "invalid_state",
+                "error_description": "Invalid or expired state parameter"
+            }, status_code=400)
+        
         # Exchange code for token
-        token = await oauth_handler.exchange_code_for_token(code, state or "")
+        token = await oauth_handler.exchange_code_for_token(code, state)
         
         # Store token
         if token.user_id:
             token_storage.store_token(token.user_id, token)
             logger.info(f"Token stored for user: {token.user_login}")
         
-        return JSONResponse({
+        return ORJSONResponse({
             "success": True,
             "user_id": token.user_id,
             "user_login": token.user_login,
@@ -92,7 +125,7 @@ async def callback(
         
     except Exception as e:
         logger.error(f"Error in OAuth callback: {e}")
-        return JSONResponse({
+        return ORJSONResponse({
             "success": False,
             "error": "authentication_failed",
             "error_description": str(e)
@@ -113,7 +146,7 @@ async def get_auth_status(user_id: str):
         token = token_storage.get_token(user_id)
         
         if not token:
-            return JSONResponse({
+            return ORJSONResponse({
                 "authenticated": False,
                 "message": "User not authenticated"
             })
@@ -124,12 +157,12 @@ async def get_auth_status(user_id: str):
         if not is_valid:
             # Remove invalid token
             token_storage.remove_token(user_id)
-            return JSONResponse({
+            return ORJSONResponse({
                 "authenticated": False,
                 "message": "Token expired or invalid"
             })
         
-        return JSONResponse({
+        return ORJSONResponse({
             "authenticated": True,
             "user_login": token.user_login,
             "scope": token.scope,
@@ -138,7 +171,7 @@ async def get_auth_status(user_id: str):
         
     except Exception as e:
         logger.error(f"Error checking auth status: {e}")
-        return JSONResponse({
+        return ORJSONResponse({
             "authenticated": False,
             "error": str(e)
         }, status_code=500)
@@ -158,14 +191,14 @@ async def logout(user_id: str):
         token_storage.remove_token(user_id)
         logger.info(f"User {user_id} logged out")
         
-        return JSONResponse({
+        return ORJSONResponse({
             "success": True,
             "message": "Logged out successfully"
         })
         
     except Exception as e:
         logger.error(f"Error during logout: {e}")
-        return JSONResponse({
+        return ORJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
@@ -179,15 +212,15 @@ async def list_authenticated_users():
         JSONResponse: List of authenticated users
     """
     try:
-        users = token_storage.list_users()
-        return JSONResponse({
+        users = list(token_storage.list_users())
+        return ORJSONResponse({
             "users": users,
             "count": len(users)
         })
         
     except Exception as e:
         logger.error(f"Error listing users: {e}")
-        return JSONResponse({
+        return ORJSONResponse({
             "error": str(e)
         }, status_code=500)
 
@@ -209,7 +242,7 @@ async def get_user_token(user_id: str):
             raise HTTPException(status_code=404, detail="User not authenticated")
         
         # Return token info without the actual access token for security
-        return JSONResponse({
+        return ORJSONResponse({
             "user_id": token.user_id,
             "user_login": token.user_login,
             "scope": token.scope,
@@ -221,7 +254,7 @@ async def get_user_token(user_id: str):
         raise
     except Exception as e:
         logger.error(f"Error getting user token: {e}")
-        return JSONResponse({
+        return ORJSONResponse({
             "error": str(e)
         }, status_code=500)
 
@@ -230,7 +263,7 @@ async def get_user_token(user_id: str):
 @oauth_app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse({
+    return ORJSONResponse({
         "status": "healthy",
         "service": "GitHub OAuth"
     })
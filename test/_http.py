@@ -0,0 +1,76 @@
+"""
+Shared HTTP client for the test scripts
+
+Scripts run in the same process and event loop reuse one pooled
+httpx.AsyncClient per base URL instead of opening their own. The
+response models for debug endpoints they both check live here too.
+"""
+
+import asyncio
+from typing import Any, Coroutine, Dict, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from pydantic import BaseModel
+
+try:
+    # Installed with uvicorn[standard] on Linux/macOS
+    import uvloop
+except ImportError:
+    uvloop = None
+
+BASE_URL = "http://localhost:10007"
+
+# A handful of connections is plenty against a local server, and short
+# timeouts keep one hung endpoint from stalling every gathered check
+LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=8, keepalive_expiry=30.0)
+TIMEOUT = httpx.Timeout(connect=1.0, read=3.0, write=2.0, pool=1.0)
+
+_LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# Keyed by event loop as well, since a client's connections can't be used from another loop
+_clients: Dict[Tuple[int, str], httpx.AsyncClient] = {}
+
+
+async def get_client(base_url: str = BASE_URL) -> httpx.AsyncClient:
+    """Return the pooled client for base_url on the running event loop"""
+    key = (id(asyncio.get_running_loop()), base_url)
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        # HTTP/2 multiplexes concurrent checks against HTTPS deployments;
+        # uvicorn itself only speaks HTTP/1.1, so locally the pool still matters
+        client = _clients[key] = httpx.AsyncClient(
+            base_url=base_url,
+            http2=True,
+            timeout=TIMEOUT,
+            limits=LIMITS,
+            # HTTP(S)_PROXY from the environment would otherwise send local
+            # requests through the proxy; remote deployments still honour it
+            trust_env=urlsplit(base_url).hostname not in _LOOPBACK_HOSTS,
+        )
+    return client
+
+
+def run(main: Coroutine[Any, Any, Any]) -> Any:
+    """Run a script's main() on uvloop when it is installed, else on asyncio"""
+    if uvloop is not None:
+        return uvloop.run(main)
+    return asyncio.run(main)
+
+
+async def close_all() -> None:
+    """Close every pooled client (call at the end of a script's main())"""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
+
+
+class StateInfo(BaseModel):
+    """One entry of /debug/oauth-states"""
+    used: bool = False
+
+
+class OAuthStates(BaseModel):
+    """Body of /debug/oauth-states (created_at and other extra fields are ignored)"""
+    total_states: int
+    states: Dict[str, StateInfo]
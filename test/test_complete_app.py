@@ -13,171 +13,239 @@ This script tests all functionalities of the GitHub Agent application:
 import asyncio
 import httpx
 import json
+import sys
 import time
-from typing import Dict, Any
+from collections import defaultdict
+from typing import Dict, Any, Iterable
+
+import orjson
+
+from _http import BASE_URL, OAuthStates, close_all, get_client, run
+
+# A live-server script run with `python`, not a pytest module: keep pytest
+# from collecting the async test_* coroutines it cannot run
+__test__ = False
+
+# Chat request body, serialized once
+_CHAT_PAYLOAD = orjson.dumps({
+    "message": "Hello, test message",
+    "user_id": "test_user"
+})
+_JSON_HEADERS = {"content-type": "application/json"}
 
 class GitHubAgentTester:
     """Comprehensive tester for GitHub Agent application"""
     
-    def __init__(self, base_url: str = "http://localhost:10007"):
+    def __init__(self, base_url: str = BASE_URL):
         self.base_url = base_url
         self.session_cookie = None
+        self._client = None
+        self._oauth_states_request = None
+        # Output of each check, written in a fixed order once checks finish
+        self._log_buffers: Dict[str, list] = defaultdict(list)
+
+    async def __aenter__(self) -> "GitHubAgentTester":
+        # One pooled client for every test (shared with the other test scripts),
+        # so requests reuse a kept-alive connection
+        self._client = await get_client(self.base_url)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        # The client is shared; main() closes it with close_all()
+        self._client = None
         
+    def _log(self, test: str, message: str) -> None:
+        """Buffer a line of output for a check"""
+        self._log_buffers[test].append(message)
+
+    def _flush_logs(self, tests: Iterable[str]) -> None:
+        """Write the buffered output of the given checks in order"""
+        lines = [line for test in tests for line in self._log_buffers.pop(test, ())]
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+
+    async def _get_oauth_states(self) -> httpx.Response:
+        """Fetch /debug/oauth-states once and share the response between checks"""
+        # Keep the in-flight request so concurrent checks await the same GET
+        if self._oauth_states_request is None:
+            self._oauth_states_request = asyncio.ensure_future(self._client.get("/debug/oauth-states"))
+        return await self._oauth_states_request
+
     async def test_server_health(self) -> bool:
         """Test if server is running and healthy"""
-        print("🔍 Testing server health...")
+        self._log('server_health', "🔍 Testing server health...")
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/health")
-                if response.status_code == 200:
-                    data = response.json()
-                    print(f"   ✅ Server is healthy: {data['status']}")
-                    return True
-                else:
-                    print(f"   ❌ Server health check failed: {response.status_code}")
-                    return False
+            response = await self._client.get("/health")
+            if response.status_code == 200:
+                data = response.json()
+                self._log('server_health', f"   ✅ Server is healthy: {data['status']}")
+                return True
+            else:
+                self._log('server_health', f"   ❌ Server health check failed: {response.status_code}")
+                return False
+        except httpx.TimeoutException as e:
+            self._log('server_health', f"   ❌ Request timed out ({type(e).__name__})")
+            return False
         except Exception as e:
-            print(f"   ❌ Server not reachable: {e}")
+            self._log('server_health', f"   ❌ Server not reachable: {e}")
             return False
     
     async def test_oauth_states(self) -> bool:
         """Test OAuth states debug endpoint"""
-        print("\n🔍 Testing OAuth states...")
+        self._log('oauth_states', "\n🔍 Testing OAuth states...")
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/debug/oauth-states")
-                if response.status_code == 200:
-                    data = response.json()
-                    print(f"   ✅ OAuth states endpoint working")
-                    print(f"   📊 Total states: {data['total_states']}")
-                    if data['states']:
-                        for state, info in data['states'].items():
-                            print(f"      - {state[:20]}... (used: {info['used']})")
-                    return True
-                else:
-                    print(f"   ❌ OAuth states endpoint failed: {response.status_code}")
-                    return False
+            response = await self._get_oauth_states()
+            if response.status_code == 200:
+                # Validated straight from the raw bytes into typed fields
+                data = OAuthStates.model_validate_json(response.content)
+                self._log('oauth_states', f"   ✅ OAuth states endpoint working")
+                self._log('oauth_states', f"   📊 Total states: {data.total_states}")
+                if data.states:
+                    for state, info in data.states.items():
+                        self._log('oauth_states', f"      - {state[:20]}... (used: {info.used})")
+                return True
+            else:
+                self._log('oauth_states', f"   ❌ OAuth states endpoint failed: {response.status_code}")
+                return False
+        except httpx.TimeoutException as e:
+            self._log('oauth_states', f"   ❌ Request timed out ({type(e).__name__})")
+            return False
         except Exception as e:
-            print(f"   ❌ OAuth states test failed: {e}")
+            self._log('oauth_states', f"   ❌ OAuth states test failed: {e}")
             return False
     
     async def test_homepage(self) -> bool:
         """Test homepage access"""
-        print("\n🔍 Testing homepage...")
+        self._log('homepage', "\n🔍 Testing homepage...")
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/")
-                if response.status_code == 200:
-                    content = response.text
-                    if "GitHub Agent" in content and "Continue with GitHub" in content:
-                        print("   ✅ Homepage loads correctly with login interface")
-                        return True
-                    else:
-                        print("   ⚠️  Homepage loads but content seems incorrect")
-                        return False
+            response = await self._client.get("/")
+            if response.status_code == 200:
+                content = response.text
+                if "GitHub Agent" in content and "Continue with GitHub" in content:
+                    self._log('homepage', "   ✅ Homepage loads correctly with login interface")
+                    return True
                 else:
-                    print(f"   ❌ Homepage failed: {response.status_code}")
+                    self._log('homepage', "   ⚠️  Homepage loads but content seems incorrect")
                     return False
+            else:
+                self._log('homepage', f"   ❌ Homepage failed: {response.status_code}")
+                return False
+        except httpx.TimeoutException as e:
+            self._log('homepage', f"   ❌ Request timed out ({type(e).__name__})")
+            return False
         except Exception as e:
-            print(f"   ❌ Homepage test failed: {e}")
+            self._log('homepage', f"   ❌ Homepage test failed: {e}")
             return False
     
     async def test_oauth_login_flow(self) -> bool:
         """Test OAuth login initiation"""
-        print("\n🔍 Testing OAuth login flow...")
+        self._log('oauth_login', "\n🔍 Testing OAuth login flow...")
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/auth/login", follow_redirects=False)
-                if response.status_code == 307:  # Redirect to GitHub
-                    location = response.headers.get('location', '')
-                    if 'github.com' in location and 'client_id=' in location:
-                        print("   ✅ OAuth login redirects to GitHub correctly")
-                        print(f"   🔗 GitHub URL: {location[:100]}...")
-                        return True
-                    else:
-                        print(f"   ❌ OAuth redirect URL seems incorrect: {location}")
-                        return False
+            response = await self._client.get("/auth/login", follow_redirects=False)
+            if response.status_code == 307:  # Redirect to GitHub
+                location = response.headers.get('location', '')
+                if 'github.com' in location and 'client_id=' in location:
+                    self._log('oauth_login', "   ✅ OAuth login redirects to GitHub correctly")
+                    self._log('oauth_login', f"   🔗 GitHub URL: {location[:100]}...")
+                    return True
                 else:
-                    print(f"   ❌ OAuth login failed: {response.status_code}")
+                    self._log('oauth_login', f"   ❌ OAuth redirect URL seems incorrect: {location}")
                     return False
+            else:
+                self._log('oauth_login', f"   ❌ OAuth login failed: {response.status_code}")
+                return False
+        except httpx.TimeoutException as e:
+            self._log('oauth_login', f"   ❌ Request timed out ({type(e).__name__})")
+            return False
         except Exception as e:
-            print(f"   ❌ OAuth login test failed: {e}")
+            self._log('oauth_login', f"   ❌ OAuth login test failed: {e}")
             return False
     
     async def test_api_endpoints(self) -> bool:
         """Test API endpoints without authentication"""
-        print("\n🔍 Testing API endpoints...")
+        self._log('api_endpoints', "\n🔍 Testing API endpoints...")
         try:
-            async with httpx.AsyncClient() as client:
-                # Test user endpoint (should return not authenticated)
-                response = await client.get(f"{self.base_url}/api/user")
-                if response.status_code == 401:
-                    print("   ✅ User API correctly returns 401 (not authenticated)")
-                else:
-                    print(f"   ⚠️  User API returned unexpected status: {response.status_code}")
-                
-                # Test repositories endpoint (should return not authenticated)
-                response = await client.get(f"{self.base_url}/api/repositories")
-                if response.status_code == 401:
-                    print("   ✅ Repositories API correctly returns 401 (not authenticated)")
-                else:
-                    print(f"   ⚠️  Repositories API returned unexpected status: {response.status_code}")
-                
-                return True
+            # Both endpoints should return not authenticated; query them together
+            user_resp, repos_resp = await asyncio.gather(
+                self._client.get("/api/user"),
+                self._client.get("/api/repositories"),
+            )
+
+            # Test user endpoint
+            if user_resp.status_code == 401:
+                self._log('api_endpoints', "   ✅ User API correctly returns 401 (not authenticated)")
+            else:
+                self._log('api_endpoints', f"   ⚠️  User API returned unexpected status: {user_resp.status_code}")
+            
+            # Test repositories endpoint
+            if repos_resp.status_code == 401:
+                self._log('api_endpoints', "   ✅ Repositories API correctly returns 401 (not authenticated)")
+            else:
+                self._log('api_endpoints', f"   ⚠️  Repositories API returned unexpected status: {repos_resp.status_code}")
+            
+            return True
+        except httpx.TimeoutException as e:
+            self._log('api_endpoints', f"   ❌ Request timed out ({type(e).__name__})")
+            return False
         except Exception as e:
-            print(f"   ❌ API endpoints test failed: {e}")
+            self._log('api_endpoints', f"   ❌ API endpoints test failed: {e}")
             return False
     
     async def test_chat_endpoint(self) -> bool:
         """Test chat endpoint without authentication"""
-        print("\n🔍 Testing chat endpoint...")
+        self._log('chat_endpoint', "\n🔍 Testing chat endpoint...")
         try:
-            async with httpx.AsyncClient() as client:
-                chat_data = {
-                    "message": "Hello, test message",
-                    "user_id": "test_user"
-                }
-                response = await client.post(
-                    f"{self.base_url}/api/chat",
-                    json=chat_data
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    if "Please authenticate" in data.get('response', ''):
-                        print("   ✅ Chat endpoint correctly requires authentication")
-                        return True
-                    else:
-                        print(f"   ⚠️  Chat endpoint response unexpected: {data}")
-                        return False
+            response = await self._client.post(
+                "/api/chat",
+                content=_CHAT_PAYLOAD,
+                headers=_JSON_HEADERS
+            )
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                if "Please authenticate" in data.get('response', ''):
+                    self._log('chat_endpoint', "   ✅ Chat endpoint correctly requires authentication")
+                    return True
                 else:
-                    print(f"   ❌ Chat endpoint failed: {response.status_code}")
+                    self._log('chat_endpoint', f"   ⚠️  Chat endpoint response unexpected: {data}")
                     return False
+            else:
+                self._log('chat_endpoint', f"   ❌ Chat endpoint failed: {response.status_code}")
+                return False
+        except httpx.TimeoutException as e:
+            self._log('chat_endpoint', f"   ❌ Request timed out ({type(e).__name__})")
+            return False
         except Exception as e:
-            print(f"   ❌ Chat endpoint test failed: {e}")
+            self._log('chat_endpoint', f"   ❌ Chat endpoint test failed: {e}")
             return False
     
     async def test_debug_endpoints(self) -> bool:
         """Test debug endpoints"""
-        print("\n🔍 Testing debug endpoints...")
+        self._log('debug_endpoints', "\n🔍 Testing debug endpoints...")
         try:
-            async with httpx.AsyncClient() as client:
-                # Test debug page
-                response = await client.get(f"{self.base_url}/debug")
-                if response.status_code == 200:
-                    print("   ✅ Debug page accessible")
-                else:
-                    print(f"   ❌ Debug page failed: {response.status_code}")
-                
-                # Test OAuth states endpoint
-                response = await client.get(f"{self.base_url}/debug/oauth-states")
-                if response.status_code == 200:
-                    print("   ✅ OAuth states debug endpoint working")
-                else:
-                    print(f"   ❌ OAuth states debug failed: {response.status_code}")
-                
-                return True
+            debug_resp, states_resp = await asyncio.gather(
+                self._client.get("/debug"),
+                self._get_oauth_states(),
+            )
+
+            # Test debug page
+            if debug_resp.status_code == 200:
+                self._log('debug_endpoints', "   ✅ Debug page accessible")
+            else:
+                self._log('debug_endpoints', f"   ❌ Debug page failed: {debug_resp.status_code}")
+            
+            # Test OAuth states endpoint
+            if states_resp.status_code == 200:
+                self._log('debug_endpoints', "   ✅ OAuth states debug endpoint working")
+            else:
+                self._log('debug_endpoints', f"   ❌ OAuth states debug failed: {states_resp.status_code}")
+            
+            return True
+        except httpx.TimeoutException as e:
+            self._log('debug_endpoints', f"   ❌ Request timed out ({type(e).__name__})")
+            return False
         except Exception as e:
-            print(f"   ❌ Debug endpoints test failed: {e}")
+            self._log('debug_endpoints', f"   ❌ Debug endpoints test failed: {e}")
             return False
     
     async def run_all_tests(self) -> Dict[str, bool]:
@@ -189,18 +257,25 @@ class GitHubAgentTester:
         
         # Test server health first
         results['server_health'] = await self.test_server_health()
+        self._flush_logs(['server_health'])
         if not results['server_health']:
             print("\n❌ Server is not running. Please start the server first:")
             print("   python3 main_app.py")
             return results
         
-        # Run all other tests
-        results['oauth_states'] = await self.test_oauth_states()
-        results['homepage'] = await self.test_homepage()
-        results['oauth_login'] = await self.test_oauth_login_flow()
-        results['api_endpoints'] = await self.test_api_endpoints()
-        results['chat_endpoint'] = await self.test_chat_endpoint()
-        results['debug_endpoints'] = await self.test_debug_endpoints()
+        # Run all other tests concurrently; they only hit anonymous endpoints and share no state
+        names = ['oauth_states', 'homepage', 'oauth_login', 'api_endpoints', 'chat_endpoint', 'debug_endpoints']
+        values = await asyncio.gather(
+            self.test_oauth_states(),
+            self.test_homepage(),
+            self.test_oauth_login_flow(),
+            self.test_api_endpoints(),
+            self.test_chat_endpoint(),
+            self.test_debug_endpoints(),
+            return_exceptions=True,
+        )
+        results.update({name: value if isinstance(value, bool) else False for name, value in zip(names, values)})
+        self._flush_logs(names)
         
         # Summary
         print("\n" + "=" * 50)
@@ -229,8 +304,11 @@ class GitHubAgentTester:
 
 async def main():
     """Main test runner"""
-    tester = GitHubAgentTester()
-    await tester.run_all_tests()
+    try:
+        async with GitHubAgentTester() as tester:
+            await tester.run_all_tests()
+    finally:
+        await close_all()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())